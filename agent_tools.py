@@ -3,46 +3,105 @@ from langchain.agents import initialize_agent, AgentType, Tool
 from langchain_community.utilities import SerpAPIWrapper
 from langchain_community.tools import DuckDuckGoSearchRun
 from config import SERPAPI_KEY
-from llm_config import llm
-
-def get_web_search_tools():
-    """Returns a list of tools for web searching."""
-    tools = []
-    if SERPAPI_KEY and SERPAPI_KEY != "hidden":
-        serp = SerpAPIWrapper(serpapi_api_key=SERPAPI_KEY)
-        tools.append(
-            Tool(
-                name="SerpAPI",
-                func=serp.run,
-                description="A premium web search engine. Use this for questions about current events, or recent information."
-            )
-        )
-    tools.append(
+from llm_config import get_llm
+from web_search import WebSearch, WebSearchCache, SearchEngine, LocalSearchBackend, DEFAULT_SEARCH_MODE
+from tracing import current_span
+
+AGENT_MAX_ITERATIONS = 5
+AGENT_TIME_BUDGET_SECONDS = 60.0
+AGENT_STOPPED_PREFIX = "Agent stopped due to"  # AgentExecutor's output when a limit is hit
+
+agent_budget_stats = {"turns": 0, "budget_hits": 0}
+
+def build_web_search(mode: str = DEFAULT_SEARCH_MODE, local: bool = False, use_cache: bool = True) -> WebSearch:
+    """
+    Builds the shared web search layer over the configured engines (SerpAPI when a key is set, and DuckDuckGo).
+    local swaps in the offline stand-in backend, e.g. for benchmarks.
+    """
+    engines = []
+    if local:
+        engines.append(SearchEngine("LocalSearch", LocalSearchBackend()))
+    else:
+        if SERPAPI_KEY and SERPAPI_KEY != "hidden":
+            serp = SerpAPIWrapper(serpapi_api_key=SERPAPI_KEY)
+            engines.append(SearchEngine("SerpAPI", serp.run))
+        engines.append(SearchEngine("DuckDuckGo", DuckDuckGoSearchRun().run))
+    return WebSearch(engines, mode=mode, cache=WebSearchCache() if use_cache else None)
+
+def get_web_search_tools(return_direct: bool = False, web_search: WebSearch = None):
+    """
+    Returns a list of tools for web searching: one tool over the shared search layer,
+    so the agent no longer tries the engines one after another itself.
+    With return_direct the search result is returned as the answer, without another agent LLM call.
+    """
+    web_search = web_search or build_web_search()
+    engine_names = ", ".join(engine.name for engine in web_search.engines)
+    return [
         Tool(
-            name="DuckDuckGo",
-            func=DuckDuckGoSearchRun().run,
-            description="A lightweight web search engine. Use this for simple web searches."
+            name="Web Search",
+            func=web_search.run,
+            description=f"A web search engine ({engine_names}). Use this for questions about current events, recent information, or anything not covered by the document.",
+            return_direct=return_direct,
         )
-    )
-    return tools
-
-def initialize_router_agent(document_tool: Tool):
+    ]
+
+def initialize_router_agent(
+    document_tool: Tool,
+    use_llm_cache: bool = False,
+    web_return_direct: bool = False,
+    max_iterations: int = AGENT_MAX_ITERATIONS,
+    max_execution_time: float = AGENT_TIME_BUDGET_SECONDS,
+    web_search: WebSearch = None,
+):
     """
     Initializes the main router agent with a toolbox.
+    use_llm_cache routes the ReAct steps through the LLM response cache.
+    web_return_direct returns web search results as the answer (the document tool sets its own return_direct).
+    max_iterations / max_execution_time (seconds) are the default per-turn budget; see with_budget() to change them per request.
+    web_search is the search layer behind the web tool (see build_web_search).
     """
-    tools = [document_tool] + get_web_search_tools()
+    tools = [document_tool] + get_web_search_tools(return_direct=web_return_direct, web_search=web_search)
 
     agent = initialize_agent(
         tools,
-        llm,
+        get_llm(use_llm_cache),
         agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
         verbose=True,
         # It tells the agent to return its steps.
-        return_intermediate_steps=True 
+        return_intermediate_steps=True,
+        max_iterations=max_iterations,
+        max_execution_time=max_execution_time,
     )
     print("\n✅ Router Agent initialized with the following tools:", [tool.name for tool in tools])
     return agent
 
+def with_budget(agent, max_iterations: int = None, max_execution_time: float = None):
+    """
+    Returns a copy of the agent with a different iteration limit and/or wall-clock budget for one request.
+    """
+    update = {}
+    if max_iterations is not None:
+        update["max_iterations"] = max_iterations
+    if max_execution_time is not None:
+        update["max_execution_time"] = max_execution_time
+    return agent.model_copy(update=update) if update else agent
+
+def record_agent_turn(agent, response: dict) -> bool:
+    """
+    Counts the turn and reports it if the agent stopped on its iteration limit or time budget.
+    The step count and budget hit are also added to the current trace span.
+    """
+    hit = str(response.get("output", "")).startswith(AGENT_STOPPED_PREFIX)
+    agent_budget_stats["turns"] += 1
+    current_span().set(**{"agent.steps": len(response.get("intermediate_steps", [])), "agent.budget_hit": hit})
+    if hit:
+        agent_budget_stats["budget_hits"] += 1
+        print(
+            f"⏳ Agent hit its budget after {len(response.get('intermediate_steps', []))} steps "
+            f"(max_iterations={agent.max_iterations}, max_execution_time={agent.max_execution_time}s)"
+        )
+    return hit
+
 
 
 # from langchain.agents import initialize_agent, AgentType, Tool
@@ -0,0 +1,160 @@
+# answer_cache.py
+import asyncio
+import json
+import os
+import threading
+import time
+
+import numpy as np
+from langchain_core.documents import Document
+
+ANSWER_CACHE_FILE = "answer_cache.json"
+SIMILARITY_THRESHOLD = 0.95
+ANSWER_TTL_SECONDS = 24 * 3600
+MAX_CACHED_ANSWERS = 512
+
+
+class SemanticAnswerCache:
+    """
+    Caches QA answers (with their source documents) keyed by the query embedding.
+    A new query whose cosine similarity to a cached query is above the threshold gets the stored answer.
+    Entries expire after ttl_seconds, the least recently used are evicted above max_entries,
+    and everything is dropped when the corpus fingerprint changes.
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        corpus_fingerprint_fn,
+        path: str = ANSWER_CACHE_FILE,
+        threshold: float = SIMILARITY_THRESHOLD,
+        ttl_seconds: float = ANSWER_TTL_SECONDS,
+        max_entries: int = MAX_CACHED_ANSWERS,
+    ):
+        self.embeddings = embeddings
+        self.corpus_fingerprint_fn = corpus_fingerprint_fn
+        self.path = path
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._fingerprint = None
+        self._entries = []
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r") as f:
+            try:
+                data = json.load(f)
+            except json.JSONDecodeError:
+                return # Corrupt JSON
+        self._fingerprint = data.get("corpus_fingerprint")
+        self._entries = data.get("entries", [])
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"corpus_fingerprint": self._fingerprint, "entries": self._entries}, f)
+        os.replace(tmp_path, self.path)
+
+    def _refresh(self):
+        """Drops every entry if the corpus changed, and the ones older than the TTL."""
+        fingerprint = self.corpus_fingerprint_fn()
+        if fingerprint != self._fingerprint:
+            if self._entries:
+                print("♻️ Corpus changed, clearing the answer cache.")
+            self._fingerprint = fingerprint
+            self._entries = []
+        now = time.time()
+        self._entries = [entry for entry in self._entries if now - entry["created"] <= self.ttl_seconds]
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, query: str):
+        """
+        Returns the cached response dict for a similar enough query, or None.
+        Also returns the normalized query vector so a miss can be stored without embedding again.
+        """
+        query_vector = self._normalize(self.embeddings.embed_query(query))
+        with self._lock:
+            self._refresh()
+            if self._entries:
+                matrix = np.asarray([entry["vector"] for entry in self._entries], dtype=np.float32)
+                scores = matrix @ query_vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    entry = self._entries[best]
+                    entry["last_used"] = time.time()
+                    self.hits += 1
+                    print(f"⚡ Answer cache hit (similarity {scores[best]:.3f} to: '{entry['query']}')")
+                    return self._to_response(query, entry), query_vector
+            self.misses += 1
+        return None, query_vector
+
+    def store(self, query: str, query_vector, response: dict):
+        entry = {
+            "query": query,
+            "vector": [float(x) for x in query_vector],
+            "result": response.get("result", ""),
+            "source_documents": [
+                {"page_content": doc.page_content, "metadata": doc.metadata}
+                for doc in response.get("source_documents", [])
+            ],
+            "created": time.time(),
+            "last_used": time.time(),
+        }
+        with self._lock:
+            self._refresh()
+            self._entries.append(entry)
+            if len(self._entries) > self.max_entries:
+                self._entries.sort(key=lambda e: e["last_used"])
+                self._entries = self._entries[-self.max_entries:]
+            self._save()
+
+    @staticmethod
+    def _to_response(query: str, entry: dict) -> dict:
+        return {
+            "query": query,
+            "result": entry["result"],
+            "source_documents": [Document(**doc) for doc in entry["source_documents"]],
+        }
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+
+class CachedQAChain:
+    """
+    Drop-in wrapper around a RetrievalQA chain: invoke(query) checks the semantic answer cache first.
+    """
+
+    def __init__(self, chain, cache: SemanticAnswerCache):
+        self.chain = chain
+        self.cache = cache
+
+    def invoke(self, query, **kwargs) -> dict:
+        question = query["query"] if isinstance(query, dict) else query
+        cached, query_vector = self.cache.lookup(question)
+        if cached is not None:
+            return cached
+        response = self.chain.invoke(query, **kwargs)
+        self.cache.store(question, query_vector, response)
+        return response
+
+    async def ainvoke(self, query, **kwargs) -> dict:
+        question = query["query"] if isinstance(query, dict) else query
+        cached, query_vector = await asyncio.to_thread(self.cache.lookup, question)
+        if cached is not None:
+            return cached
+        response = await self.chain.ainvoke(query, **kwargs)
+        await asyncio.to_thread(self.cache.store, question, query_vector, response)
+        return response
@@ -1,60 +1,324 @@
 #app.py
 import argparse 
+import asyncio
+import logging
 import os
+import sys
+import threading
 from langchain.agents import Tool
-from pdf_loader import load_and_split_pdf
-from cache_handler import is_cache_valid, save_cache_metadata, clear_db_and_cache_metadata
-from vectordb import create_vectordb_from_docs, load_existing_vectordb
-from qa_chain import get_qa_chain
-from agent_tools import initialize_router_agent
-from auto_questioner import generate_follow_up, classify_intent, create_contextual_question
+from pdf_loader import iter_split_pdf, PDF_BACKENDS, DEFAULT_PDF_BACKEND, DEFAULT_PDF_WORKERS
+from cache_handler import (
+    is_cache_valid,
+    save_cache_metadata,
+    clear_db_and_cache_metadata,
+    corpus_key,
+    get_file_entry,
+    remove_cache_metadata,
+    corpus_fingerprint,
+)
+from vectordb import load_existing_vectordb, sync_file_chunks, delete_file_chunks
+from lexical_index import rebuild_lexical_index, load_or_build_lexical_index, remove_lexical_index
+from ingestion import IngestionCheckpoint
+from answer_cache import SemanticAnswerCache
+from llm_config import get_llm_response_cache, set_rate_limit
+from context_packer import ContextPacker, CONTEXT_TOKEN_BUDGET
+from reranker import MMRReranker, RERANK_TOP_N
+from qa_chain import get_qa_chain, EXPANSION_MODES, DEFAULT_EXPANSION_MODE
+from agent_tools import initialize_router_agent, build_web_search, record_agent_turn, with_budget, agent_budget_stats, AGENT_MAX_ITERATIONS, AGENT_TIME_BUDGET_SECONDS
+from streaming import stream_agent_answer, stream_document_answer
+from router import PreRouter
+from web_search import SEARCH_MODES, DEFAULT_SEARCH_MODE
+from auto_questioner import BackgroundFollowUp, aresolve_reply, follow_up_stats
+from tracing import tracer, span, TRACE_FILE
+from batch_runner import run_batch, load_batch_questions, record_sources, BATCH_MODES, BATCH_CONCURRENCY, BATCH_REQUESTS_PER_MINUTE
 from config import (
     CHUNK_SIZE,
     CHUNK_OVERLAP,
     EMBEDDING_MODEL,
     API_KEY
 )
+from fake_backends import resolve_embedding_model, LLM_BACKEND, EMBEDDING_BACKEND
+
+# Offline backends use their own model name, so their vectors never mix with Google's
+EMBEDDING_MODEL = resolve_embedding_model(EMBEDDING_MODEL)
+
+def prepare_vectordb(pdf_path: str, rebuild: bool = False, pdf_backend: str = DEFAULT_PDF_BACKEND, pdf_workers: int = DEFAULT_PDF_WORKERS):
+    """
+    Returns a ready vector database for the PDF.
+    The fingerprint check runs first, so the PDF is only parsed and split on a cache miss or a forced rebuild.
+    Only this file's chunks are re-embedded; other files in the corpus keep theirs.
+    """
+    if rebuild:
+        clear_db_and_cache_metadata()
+        remove_lexical_index()
+
+    cache_hit = is_cache_valid(pdf_path, CHUNK_SIZE, CHUNK_OVERLAP, EMBEDDING_MODEL, pdf_backend)
+    vectordb = load_existing_vectordb(EMBEDDING_MODEL)
+    if cache_hit:
+        return vectordb
+
+    print(f"⚡ Cache miss or rebuild forced: Re-indexing '{corpus_key(pdf_path)}'...")
+    if not os.path.exists(pdf_path):
+        print(f"🔴 Error: PDF file not found at '{pdf_path}'")
+        return None
+
+    entry = get_file_entry(pdf_path)
+    old_chunk_ids = entry.get("chunk_ids") if entry else []
+    chunk_config = {"size": CHUNK_SIZE, "overlap": CHUNK_OVERLAP}
+    try:
+        # Pages are parsed, chunked, embedded and upserted as a stream
+        chunks = iter_split_pdf(pdf_path, CHUNK_SIZE, CHUNK_OVERLAP, pdf_backend, pdf_workers)
+        chunk_ids, embed_stats = sync_file_chunks(
+            vectordb, corpus_key(pdf_path), chunks, chunk_config, EMBEDDING_MODEL, old_chunk_ids
+        )
+    except ValueError as e:
+        print(f"❌ Error: The file path '{pdf_path}' is not valid or the file could not be accessed.")
+        print(f"   (Underlying error: {e})")
+        return None
+    save_cache_metadata(pdf_path, CHUNK_SIZE, CHUNK_OVERLAP, EMBEDDING_MODEL, chunk_ids, embed_stats, pdf_backend)
+    IngestionCheckpoint().clear(corpus_key(pdf_path))
+    rebuild_lexical_index(vectordb)
+    return vectordb
+
+def remove_from_corpus(pdf_path: str):
+    """
+    Deletes one file's chunks from the vector database and drops it from the corpus manifest.
+    """
+    entry = get_file_entry(pdf_path)
+    if entry is None:
+        print(f"⚠️ '{corpus_key(pdf_path)}' is not in the corpus.")
+        return
+    vectordb = load_existing_vectordb(EMBEDDING_MODEL)
+    delete_file_chunks(vectordb, corpus_key(pdf_path), entry.get("chunk_ids"))
+    remove_cache_metadata(pdf_path)
+    rebuild_lexical_index(vectordb)
+
+def print_sources(source_docs: list):
+    if source_docs:
+        print("\n--- Sources from Document ---")
+        for i, doc in enumerate(source_docs):
+            source_preview = doc.page_content[:200].replace("\n", " ") + "..."
+            page = doc.metadata.get('page', 'N/A')
+            print(f"[{i+1}] Page {page}: {source_preview}")
+        print("---------------------------")
+
+async def ainput(prompt: str) -> str:
+    """
+    Reads a line from stdin on a daemon thread: unlike asyncio.to_thread(input, ...), Ctrl-C and exit never wait
+    for a read that is still blocked. The thread uses unbuffered os.read, so it holds no lock interpreter shutdown needs.
+    """
+    loop = asyncio.get_running_loop()
+    reply = loop.create_future()
+    fd = sys.stdin.fileno()
+    sys.stdout.write(prompt)
+    sys.stdout.flush()
+
+    def deliver(setter, value):
+        if not reply.done():
+            setter(value)
+
+    def read():
+        try:
+            data = bytearray()
+            while not data.endswith(b"\n"):
+                byte = os.read(fd, 1)
+                if not byte:
+                    if not data:
+                        raise EOFError
+                    break
+                data += byte
+            result = (reply.set_result, data.decode("utf-8", errors="replace").rstrip("\r\n"))
+        except BaseException as e:  # EOFError is handled by the chat loop
+            result = (reply.set_exception, e)
+        try:
+            loop.call_soon_threadsafe(deliver, *result)
+        except RuntimeError:
+            pass  # the loop already closed
+
+    threading.Thread(target=read, daemon=True).start()
+    return await reply
+
+async def chat_loop(agent, use_llm_cache: bool, stream: bool = False, router: PreRouter = None, document_tool: Tool = None):
+    """
+    The interactive loop, run under asyncio so follow-up questions are generated in the background:
+    the next prompt shows right away and the follow-up prints when it is ready.
+    With stream=True the agent (or the routed document tool) runs with astream_events, the answer is printed
+    token by token, and every turn reports time to first token next to total time.
+    With a router, confident document questions skip the agent and go straight to the document tool.
+    """
+    mode = " (streaming mode)" if stream else ""
+    if stream:
+        # The verbose chain log (Thought/Action lines, a second Final Answer) would print over the streamed tokens
+        agent.verbose = False
+    print(f"\n✅ System ready{mode}. Ask any question about the document or the web.")
+    follow_ups = BackgroundFollowUp(use_cache=use_llm_cache)
+
+    while True:
+        try:
+            user_question = await ainput("\n 🧑‍💻 Your Question (or type 'exit'):\n> ")
+            if user_question.lower() == "exit":
+                break
+
+            # One trace per turn; with --trace every stage below shows up as a child span
+            with span("turn", question=user_question) as turn:
+                question_to_process = user_question
+
+                if follow_ups.pending or follow_ups.question:
+                    # Waits (with a timeout) for a follow-up that is still being generated,
+                    # then resolves the reply locally or with a single LLM call
+                    intent, question_to_process = await aresolve_reply(user_question, follow_ups, use_cache=use_llm_cache)
+                    if intent == "answer_to_follow_up":
+                        print(f"\n🤖 Follow-Up Question:'{question_to_process}'")
+                follow_ups.clear()
+
+                decision = await asyncio.to_thread(router.route, question_to_process) if router is not None else None
+                if decision is not None and decision.route == "document":
+                    if stream:
+                        agent_answer, ttft, total = await stream_document_answer(document_tool, question_to_process)
+                        ttft_text = f"{ttft:.2f}s" if ttft is not None else "n/a"
+                        print(f"⏱️ Time to first token: {ttft_text} | Total: {total:.2f}s (routed straight to the document)")
+                        turn.set(time_to_first_token_s=ttft)
+                    else:
+                        agent_answer = await document_tool.coroutine(question_to_process)
+                        print("\n🤖 Agent Answer:\n", agent_answer.strip())
+                    agent_answer = agent_answer.strip()
+                    turn.set(route="document")
+                    follow_ups.start(agent_answer, question_to_process)
+                    continue
+
+                if stream:
+                    response_dict, ttft, total = await stream_agent_answer(agent, {"input": question_to_process})
+                    ttft_text = f"{ttft:.2f}s" if ttft is not None else "n/a"
+                    print(f"⏱️ Time to first token: {ttft_text} | Total: {total:.2f}s")
+                    turn.set(time_to_first_token_s=ttft)
+                else:
+                    response_dict = await agent.ainvoke({"input": question_to_process})
+                    print("\n🤖 Agent Answer:\n", response_dict.get("output", "No answer found.").strip())
+                turn.set(route="agent")
+                record_agent_turn(agent, response_dict)
+                agent_answer = response_dict.get("output", "No answer found.").strip()
+
+                intermediate_steps = response_dict.get("intermediate_steps", [])
+
+                if intermediate_steps and intermediate_steps[-1][0].tool == "Document QA System":
+                    follow_ups.start(agent_answer, question_to_process)
+
+        except (KeyboardInterrupt, EOFError, asyncio.CancelledError):
+            # Ctrl-C under asyncio.run cancels this task instead of raising KeyboardInterrupt
+            print("\n👋 Exiting due to user interruption. Bye.")
+            break
+
+        except Exception as e:
+            print(f"🔴 An error occurred during agent execution: {e}")
+            follow_ups.clear()
+
+    follow_ups.clear()
+
+async def answer_batch_question(item: dict, mode: str, qa_chain, agent, router: PreRouter = None, document_tool: Tool = None) -> dict:
+    """
+    Answers one batch question without printing: straight through the QA chain in "qa" mode, otherwise like a chat turn
+    (pre-router, then the document tool or the agent). The agent gets the question's own budget if the line sets one.
+    """
+    question = item["question"]
+    if mode == "qa":
+        response = await qa_chain.ainvoke(question)
+        return {"answer": response.get("result", "No answer found.").strip(), "route": "qa", "sources": response.get("source_documents", [])}
+
+    decision = await asyncio.to_thread(router.route, question) if router is not None else None
+    if decision is not None and decision.route == "document":
+        return {"answer": (await document_tool.coroutine(question)).strip(), "route": "document"}
+
+    budgeted_agent = with_budget(agent, item.get("max_iterations"), item.get("time_budget"))
+    response = await budgeted_agent.ainvoke({"input": question})
+    record_agent_turn(budgeted_agent, response)
+    return {
+        "answer": response.get("output", "No answer found.").strip(),
+        "route": "agent",
+        "tools": [action.tool for action, _ in response.get("intermediate_steps", [])],
+    }
 
 def main():
     parser = argparse.ArgumentParser(description="Professional Document Q&A App with Router Agent")
     # parser.add_argument("--pdf", type=str, default="laws.pdf", help="Path to the PDF file to load.")
     parser.add_argument("--pdf", type=str, default="UMNwriteup.pdf", help="Path to the PDF file to load.")
     parser.add_argument("--rebuild", action="store_true", help="Force a full rebuild of the database.")
+    parser.add_argument("--remove", type=str, metavar="PDF", help="Remove a PDF's chunks from the corpus and exit.")
+    parser.add_argument("--pdf-backend", choices=PDF_BACKENDS, default=DEFAULT_PDF_BACKEND, help="Text extraction backend.")
+    parser.add_argument("--pdf-workers", type=int, default=DEFAULT_PDF_WORKERS, help="Processes used for PDF text extraction.")
+    parser.add_argument("--llm-cache", action="store_true", help="Serve repeated QA and follow-up prompts from the persistent LLM response cache (ReAct steps are never cached).")
+    parser.add_argument("--expansion-mode", choices=EXPANSION_MODES, default=DEFAULT_EXPANSION_MODE, help="MultiQuery expansion: off, cached-only or always.")
+    parser.add_argument("--no-hybrid", action="store_true", help="Use dense vector retrieval only (no BM25 index).")
+    parser.add_argument("--rerank-top-n", type=int, default=RERANK_TOP_N, help="Chunks kept by the local reranker (0 disables reranking).")
+    parser.add_argument("--no-pre-router", action="store_true", help="Send every question through the ReAct agent.")
+    parser.add_argument("--max-iterations", type=int, default=AGENT_MAX_ITERATIONS, help="Agent steps allowed per question.")
+    parser.add_argument("--time-budget", type=float, default=AGENT_TIME_BUDGET_SECONDS, help="Wall-clock seconds the agent may spend per question.")
+    parser.add_argument("--no-direct-doc-answer", action="store_true", help="Let the agent restate the document tool's answer instead of returning it directly.")
+    parser.add_argument("--web-return-direct", action="store_true", help="Return web search results directly, without another agent LLM call.")
+    parser.add_argument("--search-mode", choices=SEARCH_MODES, default=DEFAULT_SEARCH_MODE, help="Web search: engines in order, first good result of all, or merged results.")
+    parser.add_argument("--local-search", action="store_true", help="Use the offline stand-in search backend instead of the web.")
+    parser.add_argument("--stream", action="store_true", help="Async mode: stream answers token by token and report time to first token.")
+    parser.add_argument("--context-budget", type=int, default=CONTEXT_TOKEN_BUDGET, help="Token budget for the document context sent to the LLM (0 sends every retrieved chunk, unpacked).")
+    parser.add_argument("--trace", nargs="?", const=TRACE_FILE, metavar="FILE", help=f"Write OpenTelemetry JSON traces of every turn (default file: {TRACE_FILE}).")
+    parser.add_argument("--batch", type=str, metavar="JSONL", help="Answer the questions in a JSONL file instead of starting the chat.")
+    parser.add_argument("--out", type=str, default="answers.jsonl", help="Batch mode: JSONL file the answers are appended to (and resumed from).")
+    parser.add_argument("--batch-mode", choices=BATCH_MODES, default="agent", help="Batch mode: route like the chat (agent) or use the QA chain only (qa).")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="Batch mode: questions answered at once.")
+    parser.add_argument("--rpm", type=float, default=BATCH_REQUESTS_PER_MINUTE, help="Batch mode: LLM and query-embedding API calls per minute across all questions (0 for no limit).")
     args = parser.parse_args()
+    # Show each pre-router decision on the console
+    logging.getLogger("router").setLevel(logging.INFO)
+    if args.context_budget < 0:
+        parser.error("--context-budget must be a positive number of tokens, or 0 to turn packing off")
 
-    if not API_KEY or API_KEY == "hidden":
+    needs_google = LLM_BACKEND != "fake" or EMBEDDING_BACKEND != "hash"
+    if needs_google and (not API_KEY or API_KEY == "hidden"):
         print("🔴 Error: API_KEY not found or not set in config.py.")
         return
+
+    if args.trace:
+        tracer.enable(args.trace)
+
+    if args.remove:
+        remove_from_corpus(args.remove)
+        return
     
-    docs = load_and_split_pdf(args.pdf, CHUNK_SIZE, CHUNK_OVERLAP)
-    if docs is None:
+    vectordb = prepare_vectordb(args.pdf, rebuild=args.rebuild, pdf_backend=args.pdf_backend, pdf_workers=args.pdf_workers)
+    if vectordb is None:
         # Error is handling 
         return
 
-    if args.rebuild:
-        clear_db_and_cache_metadata()
-
-    if is_cache_valid(args.pdf, CHUNK_SIZE, CHUNK_OVERLAP, EMBEDDING_MODEL):
-        vectordb = load_existing_vectordb(EMBEDDING_MODEL)
-    else:
-        print("⚡ Cache miss or rebuild forced: Rebuilding database from scratch...")
-        vectordb = create_vectordb_from_docs(docs, EMBEDDING_MODEL)
-        save_cache_metadata(args.pdf, CHUNK_SIZE, CHUNK_OVERLAP, EMBEDDING_MODEL)
+    answer_cache = SemanticAnswerCache(vectordb.embeddings, lambda: corpus_fingerprint(args.pdf))
+    use_llm_cache = args.llm_cache
+    context_packer = ContextPacker(args.context_budget) if args.context_budget > 0 else None
+    lexical_index = None if args.no_hybrid else load_or_build_lexical_index(vectordb)
+    reranker = MMRReranker(vectordb, top_n=args.rerank_top_n) if args.rerank_top_n > 0 else None
+    qa_chain = get_qa_chain(
+        vectordb,
+        search_filter={"source": corpus_key(args.pdf)},
+        answer_cache=answer_cache,
+        use_llm_cache=use_llm_cache,
+        expansion_mode=args.expansion_mode,
+        context_packer=context_packer,
+        context_budget=None,
+        lexical_index=lexical_index,
+        reranker=reranker,
+    )
 
-    qa_chain = get_qa_chain(vectordb)
+    def show_sources(source_docs: list):
+        # Batch answers carry their sources in the output file instead
+        record_sources(source_docs)
+        if not args.batch:
+            print_sources(source_docs)
 
     def run_qa_and_print_sources(query: str) -> str:
         response = qa_chain.invoke(query)
-        answer = response.get("result", "No answer found.")
-        source_docs = response.get("source_documents", [])
-        if source_docs:
-            print("\n--- Sources from Document ---")
-            for i, doc in enumerate(source_docs):
-                source_preview = doc.page_content[:200].replace("\n", " ") + "..."
-                page = doc.metadata.get('page', 'N/A')
-                print(f"[{i+1}] Page {page}: {source_preview}")
-            print("---------------------------")
-        return answer
+        show_sources(response.get("source_documents", []))
+        return response.get("result", "No answer found.")
+
+    async def arun_qa_and_print_sources(query: str) -> str:
+        response = await qa_chain.ainvoke(query)
+        show_sources(response.get("source_documents", []))
+        return response.get("result", "No answer found.")
     
     # document_tool = Tool(
     #     name="Document QA System",
@@ -69,6 +333,8 @@ def main():
     document_tool = Tool(
     name="Document QA System",
     func=run_qa_and_print_sources,
+    coroutine=arun_qa_and_print_sources,
+    return_direct=not args.no_direct_doc_answer,
     # TAdv Des Work in All Scenarios   
     description=f"""
     This is your primary and most authoritative tool for answering questions about the document named '{os.path.basename(args.pdf)}'.
@@ -77,46 +343,73 @@ def main():
     """
     )
 
-    agent = initialize_router_agent(document_tool)
-
-    print("\n✅ System ready. Ask any question about the document or the web.")
-    last_follow_up_question = None
+    web_search = build_web_search(mode=args.search_mode, local=args.local_search)
+    agent = initialize_router_agent(
+        document_tool,
+        web_return_direct=args.web_return_direct,
+        max_iterations=args.max_iterations,
+        max_execution_time=args.time_budget,
+        web_search=web_search,
+    )
 
-    while True:
+    router = None if args.no_pre_router else PreRouter(
+        vectordb, {"source": corpus_key(args.pdf)}, lexical_index, document_return_direct=document_tool.return_direct
+    )
+    if args.batch:
+        # All questions share the caches, the agent and one LLM rate limit
+        agent.verbose = False
+        # Chat calls and uncached query embeddings draw from the same per-minute budget
+        vectordb.embeddings.rate_limiter = set_rate_limit(args.rpm)
+        questions = load_batch_questions(args.batch)
+        print(f"📦 Answering {len(questions)} questions from {args.batch} ({args.concurrency} at a time, {args.rpm:g} API calls/min) into {args.out}")
+        batch_stats = asyncio.run(run_batch(
+            questions,
+            args.out,
+            lambda item: answer_batch_question(item, args.batch_mode, qa_chain, agent, router, document_tool),
+            concurrency=args.concurrency,
+        ))
+        print(
+            f"📦 Batch done: {batch_stats['answered']} answered, {batch_stats['failed']} failed, "
+            f"{batch_stats['skipped']} already answered, in {batch_stats['seconds']:.1f}s"
+        )
+    else:
         try:
-            user_question = input("\n 🧑‍💻 Your Question (or type 'exit'):\n> ")
-            if user_question.lower() == "exit":
-                break
-            
-            question_to_process = user_question
-            
-            if last_follow_up_question:
-                intent = classify_intent(user_question, last_follow_up_question)
-                if intent == "answer_to_follow_up":
-                    question_to_process = create_contextual_question(user_question, last_follow_up_question)
-                    print(f"\n🤖 Follow-Up Question:'{question_to_process}'")
-
-            response_dict = agent.invoke({"input": question_to_process})
-            agent_answer = response_dict.get("output", "No answer found.").strip()
-            
-            print("\n🤖 Agent Answer:\n", agent_answer)
-            
-            intermediate_steps = response_dict.get("intermediate_steps", [])
-            
-            if intermediate_steps and intermediate_steps[-1][0].tool == "Document QA System":
-                follow_up = generate_follow_up(agent_answer, question_to_process)
-                print("\n🤔 Follow-Up Question:\n", follow_up)
-                last_follow_up_question = follow_up
-            else:
-                last_follow_up_question = None
-
-        except Exception as e:
-            print(f"🔴 An error occurred during agent execution: {e}")
-            last_follow_up_question = None
-        
+            asyncio.run(chat_loop(agent, use_llm_cache, stream=args.stream, router=router, document_tool=document_tool))
         except KeyboardInterrupt:
-             print("\n👋 Exiting due to user interruption. Bye.")
-             break
+            # A second Ctrl-C while the loop shuts down
+            print("\n👋 Exiting due to user interruption. Bye.")
+
+    stats = answer_cache.stats()
+    print(f"📊 Answer cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate)")
+    llm_response_cache = get_llm_response_cache()
+    if llm_response_cache is not None:
+        stats = llm_response_cache.stats()
+        print(f"📊 LLM response cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate)")
+    if follow_up_stats["turns"]:
+        print(
+            f"📊 Follow-up replies: {follow_up_stats['turns']} turns, {follow_up_stats['local']} resolved locally, "
+            f"{follow_up_stats['llm']} with one LLM call; saved {follow_up_stats['llm_calls_saved']} LLM calls "
+            f"({follow_up_stats['llm_calls_saved'] / follow_up_stats['turns']:.2f} per turn)"
+        )
+    stats = web_search.stats()
+    if stats["cache_hits"] + stats["cache_misses"]:
+        print(f"📊 Web search: {stats['cache_hits']} cache hits, {stats['cache_misses']} misses; wins {stats['wins']}, timeouts {stats['timeouts']}")
+    if agent_budget_stats["turns"]:
+        print(f"📊 Agent turns: {agent_budget_stats['turns']}, {agent_budget_stats['budget_hits']} hit the iteration/time budget")
+    if router is not None:
+        stats = router.stats()
+        print(f"📊 Pre-router: {stats['document']} straight to the document, {stats['agent']} to the agent; avoided {stats['llm_calls_avoided']} agent LLM calls")
+    if lexical_index is not None:
+        print(f"📊 Lexical fast path answered {lexical_index.fast_path_hits} retrievals without an embedding call")
+    if reranker is not None:
+        stats = reranker.stats()
+        print(f"📊 Reranker: {stats['chunks_before']:.1f} -> {stats['chunks_after']:.1f} chunks per query ({stats['mean_ms']:.1f} ms)")
+    if context_packer is not None:
+        print(f"📊 Context packer saved {context_packer.total_tokens_saved()} tokens over {len(context_packer.records)} queries")
+    if args.trace:
+        print(f"📊 Traces: {tracer.exported} spans written to {args.trace}; most time spent in:")
+        for name, count, seconds in tracer.stats():
+            print(f"   {name:<40} {count:>4}x {seconds:>8.2f}s")
 
 if __name__ == "__main__":
     main()
@@ -1,9 +1,14 @@
 # auto_questioner.py
-from llm_config import llm
+import asyncio
+import json
+import re
+from llm_config import get_llm
+from tracing import traced, span, current_span
 
-def generate_follow_up(summary: str, user_question: str) -> str:
-    """Generates a follow-up question based on the context."""
-    prompt = f"""
+FOLLOW_UP_WAIT_SECONDS = 5.0  # how long resolving the next input waits for a follow-up still being generated
+
+def _follow_up_prompt(summary: str, user_question: str) -> str:
+    return f"""
 You are a helpful assistant. Based on this summary of a document:
 \"\"\"{summary}\"\"\"
 
@@ -12,13 +17,64 @@ And the user's question:
 
 Ask one insightful, relevant follow-up question that explores the topic further.
 """
-    return llm.invoke(prompt).content.strip()
 
-def classify_intent(user_input: str, last_follow_up: str) -> str:
+@traced("follow_up.generate")
+def generate_follow_up(summary: str, user_question: str, use_cache: bool = False) -> str:
+    """Generates a follow-up question based on the context."""
+    return get_llm(use_cache).invoke(_follow_up_prompt(summary, user_question)).content.strip()
+
+@traced("follow_up.generate")
+async def agenerate_follow_up(summary: str, user_question: str, use_cache: bool = False) -> str:
+    return (await get_llm(use_cache).ainvoke(_follow_up_prompt(summary, user_question))).content.strip()
+
+class BackgroundFollowUp:
     """
-    Classifies the user's intent based on their input and the last follow-up question.
+    Generates the follow-up question on a background asyncio task, so the next prompt appears right away.
+    The question is printed as soon as it is ready; starting a new one (or clear()) cancels the one in flight.
     """
-    prompt = f"""
+
+    def __init__(self, use_cache: bool = False):
+        self.use_cache = use_cache
+        self.question = None
+        self._task = None
+
+    def start(self, summary: str, user_question: str):
+        self.clear()
+        self._task = asyncio.create_task(self._run(summary, user_question))
+
+    async def _run(self, summary: str, user_question: str):
+        try:
+            self.question = await agenerate_follow_up(summary, user_question, self.use_cache)
+        except Exception as e:
+            print(f"\n⚠️ Could not generate a follow-up question: {e}")
+            return
+        print("\n🤔 Follow-Up Question:\n", self.question)
+        print("> ", end="", flush=True)
+
+    @property
+    def pending(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def wait(self, timeout: float = FOLLOW_UP_WAIT_SECONDS):
+        """Returns the follow-up question, waiting up to timeout seconds; a late one is cancelled and None returned."""
+        if self.pending:
+            with span("follow_up.wait") as waiting:
+                try:
+                    await asyncio.wait_for(asyncio.shield(self._task), timeout)
+                except asyncio.TimeoutError:
+                    print(f"\n⌛ Follow-up question not ready after {timeout:g}s, treating the input as a new question.")
+                    waiting.set(timed_out=True)
+                    self.clear()
+        return self.question
+
+    def clear(self):
+        if self.pending:
+            self._task.cancel()
+        self._task = None
+        self.question = None
+
+def _intent_prompt(user_input: str, last_follow_up: str) -> str:
+    return f"""
     Analyze the user's input in the context of the 'Last Follow-Up Question' that was asked.
     Your task is to classify the user's intent.
 
@@ -32,21 +88,22 @@ def classify_intent(user_input: str, last_follow_up: str) -> str:
     2. new_question
 
     """
-    response = llm.invoke(prompt).content.strip()
-    
+
+def _parse_intent(response: str) -> str:
     if "answer_to_follow_up" in response:
         return "answer_to_follow_up"
     return "new_question"
 
-def create_contextual_question(user_input: str, last_follow_up: str) -> str:
+@traced("follow_up.classify_intent")
+def classify_intent(user_input: str, last_follow_up: str, use_cache: bool = False) -> str:
     """
-    Creates a complete, standalone question by combining the user's short input
-    with the context of the last follow-up question.
-
-    This is useful when the user's reply is brief or ambiguous (e.g., "yes", "tell me more"),
-    and you want to generate a full question that can be sent to a search or QA system.
+    Classifies the user's intent based on their input and the last follow-up question.
     """
-    prompt = f"""
+    response = get_llm(use_cache).invoke(_intent_prompt(user_input, last_follow_up)).content.strip()
+    return _parse_intent(response)
+
+def _contextual_prompt(user_input: str, last_follow_up: str) -> str:
+    return f"""
     You are an expert at understanding conversation context.
     A user was asked the following question: "{last_follow_up}"
     The user responded with this short phrase: "{user_input}"
@@ -59,7 +116,106 @@ def create_contextual_question(user_input: str, last_follow_up: str) -> str:
 
     Generate the complete, standalone question now.
     """
-    return llm.invoke(prompt).content.strip()
+
+@traced("follow_up.contextual_question")
+def create_contextual_question(user_input: str, last_follow_up: str, use_cache: bool = False) -> str:
+    """
+    Creates a complete, standalone question by combining the user's short input
+    with the context of the last follow-up question.
+
+    This is useful when the user's reply is brief or ambiguous (e.g., "yes", "tell me more"),
+    and you want to generate a full question that can be sent to a search or QA system.
+    """
+    return get_llm(use_cache).invoke(_contextual_prompt(user_input, last_follow_up)).content.strip()
+
+# Replies that obviously accept the follow-up question, and what they turn it into
+AFFIRMATIVE_REPLIES = {
+    "yes", "yes please", "yeah", "yep", "sure", "ok", "okay", "please", "please do", "go on", "go ahead",
+    "continue", "tell me more", "more", "more please", "sounds good", "of course", "definitely",
+}
+ELABORATION_REPLIES = {
+    "why": "Explain why.",
+    "why is that": "Explain why.",
+    "how": "Explain how.",
+    "how so": "Explain how.",
+    "explain": "Explain in detail.",
+    "explain that": "Explain in detail.",
+    "elaborate": "Explain in detail.",
+    "tell me more about that": "Explain in detail.",
+}
+STANDALONE_MIN_WORDS = 8  # a question this long without references to earlier turns is treated as new
+REFERENCE_WORDS = {"that", "this", "it", "its", "those", "these", "they", "them", "above", "previous", "more"}
+
+follow_up_stats = {"turns": 0, "local": 0, "llm": 0, "llm_calls_saved": 0}
+
+def _record_resolution(intent: str, local: bool):
+    # The old path made one classify_intent call, plus create_contextual_question for answers to the follow-up
+    old_calls = 2 if intent == "answer_to_follow_up" else 1
+    follow_up_stats["turns"] += 1
+    follow_up_stats["local" if local else "llm"] += 1
+    follow_up_stats["llm_calls_saved"] += old_calls - (0 if local else 1)
+    current_span().set(intent=intent, local=local)
+
+def local_resolve_reply(user_input: str, last_follow_up: str):
+    """
+    Rule-based fast path for obvious replies; returns (intent, question to process) or None when unsure.
+    """
+    normalized = re.sub(r"[^\w\s]", "", user_input.lower()).strip()
+    normalized = re.sub(r"\s+", " ", normalized)
+    if normalized in AFFIRMATIVE_REPLIES:
+        return "answer_to_follow_up", last_follow_up
+    if normalized in ELABORATION_REPLIES:
+        return "answer_to_follow_up", f"{last_follow_up} {ELABORATION_REPLIES[normalized]}"
+    words = normalized.split()
+    if len(words) >= STANDALONE_MIN_WORDS and not REFERENCE_WORDS & set(words):
+        return "new_question", user_input
+    return None
+
+def _resolve_prompt(user_input: str, last_follow_up: str) -> str:
+    return f"""
+    A user was asked the follow-up question: "{last_follow_up}"
+    The user then wrote: "{user_input}"
+
+    Decide whether the user's input is a response to the follow-up question (e.g. 'yes', 'tell me more', 'what about the second one?')
+    or a new, unrelated question. If it is a response, rephrase it into a complete, standalone question that can be sent to a search system.
+
+    Respond with ONLY a JSON object:
+    {{"intent": "answer_to_follow_up" or "new_question", "question": "<the standalone question, or the user's input unchanged for a new question>"}}
+    """
+
+def _parse_resolution(response: str, user_input: str) -> tuple:
+    match = re.search(r"\{.*\}", response, re.DOTALL)
+    if match:
+        try:
+            data = json.loads(match.group(0))
+            intent = _parse_intent(str(data.get("intent", "")))
+            question = str(data.get("question") or "").strip()
+            return intent, (question if intent == "answer_to_follow_up" and question else user_input)
+        except json.JSONDecodeError:
+            pass
+    # Not valid JSON: keep the intent if it is recognisable, without a rewrite
+    return _parse_intent(response), user_input
+
+@traced("follow_up.resolve")
+async def aresolve_reply(user_input: str, last_follow_up, use_cache: bool = False, wait_timeout: float = FOLLOW_UP_WAIT_SECONDS) -> tuple:
+    """
+    Returns (intent, question to process) for an input that follows a follow-up question:
+    the local rules first, otherwise one structured LLM call instead of classify_intent + create_contextual_question.
+    last_follow_up may be a BackgroundFollowUp that is still generating: it is awaited for up to wait_timeout seconds,
+    and without a follow-up the input is a new question.
+    """
+    if isinstance(last_follow_up, BackgroundFollowUp):
+        last_follow_up = await last_follow_up.wait(wait_timeout)
+    if not last_follow_up:
+        return "new_question", user_input
+    resolved = local_resolve_reply(user_input, last_follow_up)
+    if resolved is not None:
+        _record_resolution(resolved[0], local=True)
+        return resolved
+    response = (await get_llm(use_cache).ainvoke(_resolve_prompt(user_input, last_follow_up))).content.strip()
+    resolved = _parse_resolution(response, user_input)
+    _record_resolution(resolved[0], local=False)
+    return resolved
 
 
 
@@ -0,0 +1,138 @@
+# batch_runner.py
+import asyncio
+import contextvars
+import json
+import os
+import time
+
+from tracing import span
+
+BATCH_CONCURRENCY = 4  # questions in flight at once
+BATCH_REQUESTS_PER_MINUTE = 60  # LLM and query-embedding API calls per minute across all of them (cache hits are free)
+BATCH_MODES = ("agent", "qa")
+
+_collected_sources = contextvars.ContextVar("collected_sources", default=None)
+
+
+def record_sources(source_docs: list):
+    """
+    Called by the document tool with the chunks behind its answer. Inside a batch question they are kept
+    for that question's output line; anywhere else this does nothing.
+    """
+    bucket = _collected_sources.get()
+    if bucket is not None:
+        bucket.extend(source_docs)
+
+
+def format_sources(source_docs: list) -> list:
+    """Source chunks as JSON-ready dicts: file, page and a short preview, without repeats."""
+    sources = []
+    seen = set()
+    for doc in source_docs:
+        key = doc.id or (doc.metadata.get("source"), doc.metadata.get("page"), doc.page_content[:200])
+        if key in seen:
+            continue
+        seen.add(key)
+        sources.append({
+            "source": doc.metadata.get("source"),
+            "page": doc.metadata.get("page"),
+            "preview": doc.page_content[:200].replace("\n", " "),
+        })
+    return sources
+
+
+def load_batch_questions(path: str) -> list:
+    """
+    Reads a JSONL file of {"question": ..., "id": ...} lines; "id" defaults to the line number.
+    Optional "max_iterations" and "time_budget" set that question's agent budget.
+    """
+    questions = []
+    with open(path, "r") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_number} is not valid JSON ({e})")
+            if not str(item.get("question") or "").strip():
+                raise ValueError(f"{path}:{line_number} has no 'question'")
+            item["id"] = str(item.get("id", line_number))
+            questions.append(item)
+    return questions
+
+
+def answered_ids(out_path: str) -> set:
+    """
+    IDs already answered in an earlier, possibly interrupted run. Failed questions are not counted, so they are retried,
+    and a half-written last line (e.g. after a crash) is ignored.
+    """
+    done = set()
+    if not os.path.exists(out_path):
+        return done
+    with open(out_path, "r") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if "error" not in record:
+                done.add(str(record.get("id")))
+    return done
+
+
+def _ends_with_newline(path: str) -> bool:
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+async def run_batch(questions: list, out_path: str, answer_fn, concurrency: int = BATCH_CONCURRENCY) -> dict:
+    """
+    Answers questions with at most `concurrency` in flight and appends one JSON line per question to out_path
+    as soon as it completes (so output order is completion order; match lines by "id").
+    answer_fn is an async function item -> {"answer": ..., "route": ..., "sources": [...]}; chunks passed to
+    record_sources while it runs are added to the sources. Questions already answered in out_path are skipped,
+    so an interrupted run continues where it stopped; for a retried failure the later line is the current one.
+    """
+    done = answered_ids(out_path)
+    pending = [item for item in questions if item["id"] not in done]
+    if len(pending) < len(questions):
+        print(f"⏭️ Resuming: {len(questions) - len(pending)} of {len(questions)} questions already answered in {out_path}")
+    stats = {"answered": 0, "failed": 0, "skipped": len(questions) - len(pending), "seconds": 0.0}
+    if not pending:
+        return stats
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    batch_start = time.perf_counter()
+
+    async def answer_one(item: dict) -> dict:
+        async with semaphore:
+            sources = []
+            _collected_sources.set(sources)  # this task's own context, shared with the tasks it starts
+            start = time.perf_counter()
+            record = {"id": item["id"], "question": item["question"]}
+            try:
+                with span("batch.question", id=item["id"], question=item["question"]):
+                    result = await answer_fn(item)
+                record.update(result)
+                record["sources"] = format_sources(sources + list(result.get("sources", [])))
+            except Exception as e:
+                record["error"] = f"{type(e).__name__}: {e}"
+            record["seconds"] = round(time.perf_counter() - start, 3)
+            return record
+
+    with open(out_path, "a") as out:
+        if out.tell() and not _ends_with_newline(out_path):
+            out.write("\n")  # close a half-written line so the next answer starts on its own
+        tasks = [asyncio.create_task(answer_one(item)) for item in pending]
+        for finished in asyncio.as_completed(tasks):
+            record = await finished
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            stats["failed" if "error" in record else "answered"] += 1
+            status = f"🔴 {record['error']}" if "error" in record else f"✅ {record.get('route', '')}"
+            print(f"[{stats['answered'] + stats['failed']}/{len(pending)}] {record['id']}: {status} ({record['seconds']:.1f}s)")
+
+    stats["seconds"] = time.perf_counter() - batch_start
+    return stats
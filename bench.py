@@ -0,0 +1,473 @@
+# bench.py
+import argparse
+import contextlib
+import inspect
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.embeddings import Embeddings
+from langchain.agents import Tool
+
+from pdf_loader import load_and_split_pdf, iter_pdf_pages, PDF_BACKENDS
+from cache_handler import is_cache_valid
+from app import prepare_vectordb
+from cache_handler import corpus_key
+from qa_chain import get_qa_chain, expansion_config, QueryExpansionCache
+from reranker import MMRReranker
+from context_packer import ContextPacker
+from tokens import count_tokens
+from tracing import llm_usage
+from lexical_index import LexicalIndex
+from router import PreRouter
+from vectordb import create_vectordb_from_docs, get_embedding_function
+from embedding_cache import SQLiteEmbeddingStore
+from agent_tools import initialize_router_agent, build_web_search
+from llm_config import get_llm_response_cache
+from web_search import WebSearch, WebSearchCache, SearchEngine, LocalSearchBackend, SEARCH_MODES
+from config import CHUNK_SIZE, CHUNK_OVERLAP, EMBEDDING_MODEL
+from fake_backends import resolve_embedding_model, LLM_BACKEND, EMBEDDING_BACKEND
+
+EMBEDDING_MODEL = resolve_embedding_model(EMBEDDING_MODEL)
+WORKLOAD_STAGES = ("route", "retrieval", "qa", "turn")
+
+
+def _timed(fn, runs: int) -> list:
+    """Runs fn `runs` times and returns the wall-clock seconds of each run."""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _report(label: str, timings: list):
+    print(f"{label:<28} runs={len(timings):<3} mean={statistics.mean(timings):.3f}s  min={min(timings):.3f}s  max={max(timings):.3f}s")
+
+
+def bench_startup(pdf_path: str, runs: int, cold: bool):
+    """
+    Compares warm and cold startup.
+    warm (lazy)  -> fingerprint check + load from ./chroma_db (current path)
+    warm (eager) -> parse + split the PDF first, then load (old path)
+    cold         -> full rebuild, which calls the embedding API
+    """
+    print(f"⏱️ Startup benchmark for: {pdf_path}")
+
+    if cold:
+        _report("cold (rebuild)", _timed(lambda: prepare_vectordb(pdf_path, rebuild=True), runs))
+
+    if not is_cache_valid(pdf_path, CHUNK_SIZE, CHUNK_OVERLAP, EMBEDDING_MODEL):
+        print("⚠️ No valid cache for this PDF, skipping warm runs. Use --cold to build it first.")
+        return
+
+    def eager_start():
+        load_and_split_pdf(pdf_path, CHUNK_SIZE, CHUNK_OVERLAP, use_cache=False)
+        prepare_vectordb(pdf_path)
+
+    _report("warm (eager, old path)", _timed(eager_start, runs))
+    _report("warm (lazy)", _timed(lambda: prepare_vectordb(pdf_path), runs))
+
+
+def bench_extract(pdf_paths: list, backends: list, worker_counts: list, runs: int):
+    """
+    Reports PDF text extraction throughput (pages/sec) for each backend and worker count.
+    """
+    print(f"{'pdf':<18} {'backend':<9} {'workers':>7} {'pages':>6} {'mean s':>8} {'pages/s':>9}")
+    for pdf_path in pdf_paths:
+        for backend in backends:
+            for workers in worker_counts:
+                page_counts = []
+                timings = _timed(lambda: page_counts.append(sum(1 for _ in iter_pdf_pages(pdf_path, backend, workers))), runs)
+                mean = statistics.mean(timings)
+                print(f"{pdf_path:<18} {backend:<9} {workers:>7} {page_counts[0]:>6} {mean:>8.3f} {page_counts[0] / mean:>9.1f}")
+
+
+def _load_questions(path: str) -> list:
+    """Reads a JSONL file with one {"question": ...} object per line."""
+    with open(path, "r") as f:
+        return [json.loads(line)["question"] for line in f if line.strip()]
+
+
+def bench_expansion(pdf_path: str, questions: list, runs: int):
+    """
+    Compares retrieval and end-to-end QA latency for each query expansion mode.
+    The LLM response cache is disabled, and 'always' starts from an empty expansion cache
+    so it pays the expansion call; 'cached' then reuses those expansions.
+    """
+    vectordb = prepare_vectordb(pdf_path)
+    if vectordb is None:
+        return
+    expansion_cache = QueryExpansionCache(path=None)
+    chain = get_qa_chain(
+        vectordb,
+        search_filter={"source": corpus_key(pdf_path)},
+        use_llm_cache=False,
+        expansion_cache=expansion_cache,
+    )
+
+    print(f"{'mode':<8} {'retrieval mean s':>17} {'end-to-end mean s':>18}")
+    for mode in ("off", "always", "cached"):
+        config = expansion_config(mode)
+        retrieval = []
+        end_to_end = []
+        for question in questions:
+            if mode == "always":
+                expansion_cache.clear()
+            retrieval += _timed(lambda: chain.retriever.invoke(question, config=config), runs)
+            if mode == "always":
+                expansion_cache.clear()
+            end_to_end += _timed(lambda: chain.invoke(question, config=config), runs)
+        print(f"{mode:<8} {statistics.mean(retrieval):>17.3f} {statistics.mean(end_to_end):>18.3f}")
+
+
+def bench_rerank(pdf_path: str, questions: list, runs: int):
+    """
+    Compares the current retrieval path with the reranked one: retrieval latency, chunks and
+    context tokens handed to the stuff chain, and end-to-end QA latency.
+    Both chains share one in-memory expansion cache, warmed first, so neither pays the expansion call.
+    The context packer is disabled so the token counts show what the retriever passes on.
+    """
+    vectordb = prepare_vectordb(pdf_path)
+    if vectordb is None:
+        return
+    expansion_cache = QueryExpansionCache(path=None)
+    chains = {
+        name: get_qa_chain(
+            vectordb,
+            search_filter={"source": corpus_key(pdf_path)},
+            use_llm_cache=False,
+            expansion_cache=expansion_cache,
+            context_budget=None,
+            reranker=reranker,
+        )
+        for name, reranker in (("current", None), ("reranked", MMRReranker(vectordb)))
+    }
+    for question in questions:
+        chains["current"].retriever.invoke(question)
+
+    print(f"{'path':<9} {'retrieval mean s':>17} {'chunks':>7} {'tokens':>7} {'end-to-end mean s':>18}")
+    for name, chain in chains.items():
+        retrieval, end_to_end, chunks, tokens = [], [], [], []
+        for question in questions:
+            documents = chain.retriever.invoke(question)
+            chunks.append(len(documents))
+            tokens.append(sum(count_tokens(doc.page_content) for doc in documents))
+            retrieval += _timed(lambda: chain.retriever.invoke(question), runs)
+            end_to_end += _timed(lambda: chain.invoke(question), runs)
+        print(
+            f"{name:<9} {statistics.mean(retrieval):>17.3f} {statistics.mean(chunks):>7.1f} "
+            f"{statistics.mean(tokens):>7.0f} {statistics.mean(end_to_end):>18.3f}"
+        )
+
+
+def bench_search(questions: list, latencies: list, timeout: float):
+    """
+    Compares the web search modes offline, with one local stand-in engine per latency,
+    for a cold and then a warm (in-memory) result cache.
+    """
+    engines = [
+        SearchEngine(f"local-{latency:g}s", LocalSearchBackend(latency=latency), timeout=timeout)
+        for latency in latencies
+    ]
+    print(f"{'mode':<11} {'cold mean s':>12} {'warm mean s':>12}")
+    for mode in SEARCH_MODES:
+        search = WebSearch(engines, mode=mode, cache=WebSearchCache(path=None))
+        cold = [t for question in questions for t in _timed(lambda: search.run(question), 1)]
+        warm = [t for question in questions for t in _timed(lambda: search.run(question), 1)]
+        print(f"{mode:<11} {statistics.mean(cold):>12.3f} {statistics.mean(warm):>12.3f}")
+
+
+class _CountingEmbeddings(Embeddings):
+    """Sits between the embedding cache and the model and counts the requests and texts that reach the model."""
+
+    def __init__(self, underlying: Embeddings):
+        self.underlying = underlying
+        self.calls = 0
+        self.texts = 0
+        self._lock = threading.Lock()
+
+    def _count(self, texts: int):
+        with self._lock:
+            self.calls += 1
+            self.texts += texts
+
+    def embed_documents(self, texts: list, task_type: str = None) -> list:
+        self._count(len(texts))
+        if task_type and "task_type" in inspect.signature(self.underlying.embed_documents).parameters:
+            return self.underlying.embed_documents(texts, task_type=task_type)
+        return self.underlying.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list:
+        self._count(1)
+        return self.underlying.embed_query(text)
+
+
+class _UsageCallback(BaseCallbackHandler):
+    """
+    Counts LLM calls and tokens for every LLM run it is attached to (agent, tools, MultiQuery and stuff chains).
+    Token counts come from tracing.llm_usage. LLM response cache hits count as calls too;
+    they are reported separately from the cache's own stats.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._prompts = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id, prompt: str):
+        with self._lock:
+            self.calls += 1
+            self._prompts[run_id] = count_tokens(prompt)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id, "\n".join(prompts))
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id, "\n".join(str(message.content) for batch in messages for message in batch))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self._lock:
+            usage = llm_usage(response, self._prompts.pop(run_id, 0))
+            self.prompt_tokens += usage["input_tokens"]
+            self.completion_tokens += usage["output_tokens"]
+
+    def snapshot(self) -> tuple:
+        with self._lock:
+            return self.calls, self.prompt_tokens, self.completion_tokens
+
+
+def _percentiles(timings: list) -> dict:
+    return {
+        "runs": len(timings),
+        "mean_s": float(np.mean(timings)),
+        "p50_s": float(np.percentile(timings, 50)),
+        "p95_s": float(np.percentile(timings, 95)),
+        "p99_s": float(np.percentile(timings, 99)),
+    }
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_workload(pdf_path: str, questions: list, stages: list, use_llm_cache: bool) -> dict:
+    """
+    Replays a question workload through the real pipeline and returns the results as a JSON-ready dict:
+    load_and_split_pdf -> create_vectordb_from_docs (into a scratch directory) -> get_qa_chain -> pre-router + agent.
+    Per question it times the selected stages:
+      route     -> PreRouter decision only
+      retrieval -> the QA chain's retriever (expansion, hybrid search, rerank, packing)
+      qa        -> the whole QA chain
+      turn      -> what the user waits for: route, then the document tool directly or the agent
+    The expansion cache is emptied before every stage so each one pays its own expansion call;
+    the PDF is split without the chunk cache and the embedding cache lives in the scratch directory,
+    so results don't depend on earlier runs. Router counts cover the turn stage (the route stage without it).
+    Backends come from LLM_BACKEND / EMBEDDING_BACKEND (see fake_backends.py); web search uses the offline stand-in.
+    """
+    usage = _UsageCallback()
+    callbacks = {"callbacks": [usage]}
+    scratch_dir = tempfile.mkdtemp(prefix="bench_workload_")
+    timings = {stage: [] for stage in ["load_and_split", "index"] + stages}
+    stage_usage = {stage: [0, 0, 0] for stage in timings}
+    llm_response_cache = get_llm_response_cache()
+    llm_cache_hits_before = llm_response_cache.hits if llm_response_cache is not None else 0
+
+    def run_stage(stage: str, fn):
+        before = usage.snapshot()
+        start = time.perf_counter()
+        result = fn()
+        timings[stage].append(time.perf_counter() - start)
+        after = usage.snapshot()
+        for i in range(3):
+            stage_usage[stage][i] += after[i] - before[i]
+        return result
+
+    try:
+        docs = run_stage("load_and_split", lambda: load_and_split_pdf(pdf_path, CHUNK_SIZE, CHUNK_OVERLAP, use_cache=False))
+        if not docs:
+            raise SystemExit(f"❌ No chunks could be loaded from '{pdf_path}'.")
+        embeddings = get_embedding_function(EMBEDDING_MODEL)
+        counter = _CountingEmbeddings(embeddings.underlying)
+        embeddings.underlying = counter
+        embeddings.store = SQLiteEmbeddingStore(path=os.path.join(scratch_dir, "embedding_cache.sqlite3"))
+        vectordb = run_stage("index", lambda: create_vectordb_from_docs(
+            docs, EMBEDDING_MODEL, persist_directory=os.path.join(scratch_dir, "chroma_db"), embedding_function=embeddings
+        ))
+        rss_after_index = _peak_rss_mb()
+
+        lexical_index = LexicalIndex.build_from_vectordb(vectordb)
+        expansion_cache = QueryExpansionCache(path=None)
+        chain = get_qa_chain(
+            vectordb,
+            use_llm_cache=use_llm_cache,
+            expansion_cache=expansion_cache,
+            context_packer=ContextPacker(),
+            lexical_index=lexical_index,
+            reranker=MMRReranker(vectordb),
+        )
+
+        def ask_document(query: str, callbacks=None) -> str:
+            response = chain.invoke({"query": query}, config={"callbacks": callbacks})
+            return response.get("result", "No answer found.")
+
+        document_tool = Tool(
+            name="Document QA System",
+            func=ask_document,
+            return_direct=True,
+            description=f"Primary tool for questions about the document '{os.path.basename(pdf_path)}'.",
+        )
+        agent = initialize_router_agent(document_tool, web_search=build_web_search(local=True, use_cache=False))
+        agent.verbose = False
+        router = PreRouter(vectordb, lexical_index=lexical_index, document_return_direct=document_tool.return_direct)
+        # The route stage gets its own router when turns run too, so each question's route is counted once
+        route_router = PreRouter(vectordb, lexical_index=lexical_index) if "turn" in stages else router
+
+        def turn(question: str):
+            if router.route(question).route == "document":
+                return ask_document(question, callbacks=[usage])
+            return agent.invoke({"input": question}, config=callbacks)
+
+        stage_functions = {
+            "route": lambda question: route_router.route(question),
+            "retrieval": lambda question: chain.retriever.invoke(question, config=callbacks),
+            "qa": lambda question: chain.invoke({"query": question}, config=callbacks),
+            "turn": turn,
+        }
+        for question in questions:
+            for stage in stages:
+                expansion_cache.clear()
+                run_stage(stage, lambda: stage_functions[stage](question))
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    calls, prompt_tokens, completion_tokens = usage.snapshot()
+    llm_response_cache = get_llm_response_cache()
+    llm_cache_hits = llm_response_cache.hits - llm_cache_hits_before if llm_response_cache is not None else 0
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": {
+            "pdf": pdf_path,
+            "questions": len(questions),
+            "stages": stages,
+            "llm_backend": LLM_BACKEND,
+            "embedding_backend": EMBEDDING_BACKEND,
+            "embedding_model": EMBEDDING_MODEL,
+            "chunk_size": CHUNK_SIZE,
+            "chunk_overlap": CHUNK_OVERLAP,
+            "llm_cache": use_llm_cache,
+        },
+        "chunks": len(docs),
+        "stages": {
+            stage: {
+                **_percentiles(stage_timings),
+                "llm_calls_per_run": stage_usage[stage][0] / len(stage_timings),
+                "tokens_per_run": (stage_usage[stage][1] + stage_usage[stage][2]) / len(stage_timings),
+            }
+            for stage, stage_timings in timings.items()
+            if stage_timings
+        },
+        "llm": {
+            "calls": calls,
+            "cache_hits": llm_cache_hits,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+        },
+        "embeddings": {"calls": counter.calls, "texts": counter.texts, **embeddings.stats()},
+        "router": router.stats(),
+        "peak_rss_mb": {"after_index": rss_after_index, "total": _peak_rss_mb()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Performance benchmarks for the Document Q&A App")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    startup = subparsers.add_parser("startup", help="Compare warm and cold startup time.")
+    startup.add_argument("--pdf", type=str, default="UMNwriteup.pdf", help="Path to the PDF file to load.")
+    startup.add_argument("--runs", type=int, default=3, help="Number of runs per scenario.")
+    startup.add_argument("--cold", action="store_true", help="Also time a full rebuild (calls the embedding API).")
+
+    extract = subparsers.add_parser("extract", help="Compare PDF extraction backends and worker counts.")
+    extract.add_argument("--pdf", nargs="+", default=["laws.pdf", "UMNwriteup.pdf"], help="PDF files to extract.")
+    extract.add_argument("--backends", nargs="+", choices=PDF_BACKENDS, default=list(PDF_BACKENDS))
+    extract.add_argument("--workers", nargs="+", type=int, default=[1, 2, 4], help="Worker process counts to try.")
+    extract.add_argument("--runs", type=int, default=3, help="Number of runs per combination.")
+
+    expansion = subparsers.add_parser("expansion", help="Compare query expansion modes (calls the LLM).")
+    expansion.add_argument("--pdf", type=str, default="UMNwriteup.pdf", help="Path to the PDF file to load.")
+    expansion.add_argument("--questions", type=str, help="JSONL file of {\"question\": ...} lines.")
+    expansion.add_argument("--runs", type=int, default=1, help="Number of runs per question and mode.")
+
+    rerank = subparsers.add_parser("rerank", help="Compare retrieval with and without the local reranker (calls the LLM).")
+    rerank.add_argument("--pdf", type=str, default="UMNwriteup.pdf", help="Path to the PDF file to load.")
+    rerank.add_argument("--questions", type=str, help="JSONL file of {\"question\": ...} lines.")
+    rerank.add_argument("--runs", type=int, default=1, help="Number of runs per question and path.")
+
+    search = subparsers.add_parser("search", help="Compare web search modes with offline stand-in engines.")
+    search.add_argument("--questions", type=str, help="JSONL file of {\"question\": ...} lines.")
+    search.add_argument("--latencies", nargs="+", type=float, default=[0.8, 0.3], help="Simulated latency of each engine.")
+    search.add_argument("--timeout", type=float, default=2.0, help="Per-engine timeout in seconds.")
+
+    workload = subparsers.add_parser("workload", help="Replay a question workload through the whole pipeline and report JSON.")
+    workload.add_argument("--pdf", type=str, default="UMNwriteup.pdf", help="Path to the PDF file to ingest.")
+    workload.add_argument("--workload", type=str, default="bench_workload.jsonl", help="JSONL file of {\"question\": ...} lines.")
+    workload.add_argument("--stages", nargs="+", choices=WORKLOAD_STAGES, default=list(WORKLOAD_STAGES))
+    workload.add_argument("--llm-cache", action="store_true", help="Let the LLM response cache serve repeated QA prompts, as app.py --llm-cache does.")
+    workload.add_argument("--out", type=str, default="-", help="Where to write the JSON results ('-' for stdout).")
+
+    args = parser.parse_args()
+    if args.command == "startup":
+        bench_startup(args.pdf, args.runs, args.cold)
+    elif args.command == "extract":
+        bench_extract(args.pdf, args.backends, args.workers, args.runs)
+    elif args.command == "expansion":
+        questions = _load_questions(args.questions) if args.questions else ["What is this document about?"]
+        bench_expansion(args.pdf, questions, args.runs)
+    elif args.command == "rerank":
+        questions = _load_questions(args.questions) if args.questions else ["What is this document about?"]
+        bench_rerank(args.pdf, questions, args.runs)
+    elif args.command == "search":
+        questions = _load_questions(args.questions) if args.questions else ["Latest news about fair use", "Java API copyright"]
+        bench_search(questions, args.latencies, args.timeout)
+    elif args.command == "workload":
+        # Pipeline progress goes to stderr so stdout carries only the JSON
+        with contextlib.redirect_stdout(sys.stderr):
+            results = bench_workload(args.pdf, _load_questions(args.workload), args.stages, args.llm_cache)
+        if args.out == "-":
+            print(json.dumps(results, indent=2))
+        else:
+            with open(args.out, "w") as f:
+                json.dump(results, f, indent=2)
+            print(f"✅ Results written to {args.out}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
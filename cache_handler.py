@@ -3,14 +3,24 @@ import os
 import json # iska main purpose ye hai ki hum apne cache metadata ko json file mein store kar saken 
 import hashlib # ye bas ye dekhne ke liye hai ki document change hua hai ya nahi if yes to dubara embed karta hai
 import shutil # Python ka built-in module jo file/folder operations ke liye use hota hai example: delete karna, copy karna, move karna, etc.
+import gzip
+import io
+from langchain_core.documents import Document
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None # falls back to gzip
 
 # This is the single source of truth for cache metadata
 CACHE_MASTER_FILE = "cache_master.json"
 VECTOR_DB_DIR = "./chroma_db"
+CHUNK_CACHE_DIR = "./chunk_cache"
+MAX_CHUNK_CACHE_BYTES = 512 * 1024 * 1024
 
-def _generate_fingerprint(file_path: str, chunk_config: dict, model_name: str) -> str:
+def file_sha256(file_path: str):
     """
-    Generates a unique fingerprint based on file content and processing configuration.
+    Returns the SHA-256 hex digest of a file's content, or None if the file does not exist.
     """
     file_hash = hashlib.sha256() #sha256 ek cryptographic hash function hai jo input data ko fixed-size string mein convert karta hai
     try:
@@ -18,52 +28,127 @@ def _generate_fingerprint(file_path: str, chunk_config: dict, model_name: str) -
             while chunk := f.read(8192): 
                 file_hash.update(chunk) # ye file ke har chunk ko read karke uska hash update kar raha hai
     except FileNotFoundError:
+        return None
+    return file_hash.hexdigest()
+
+def _generate_fingerprint(file_path: str, chunk_config: dict, model_name: str) -> str:
+    """
+    Generates a unique fingerprint based on file content and processing configuration.
+    """
+    file_digest = file_sha256(file_path)
+    if file_digest is None:
         return "file_not_found"
 
     config_string = f"{chunk_config['size']}-{chunk_config['overlap']}-{model_name}" 
+    # Other extraction backends produce different chunk texts (pypdf is left out so existing fingerprints stay valid)
+    if chunk_config.get("backend", "pypdf") != "pypdf":
+        config_string += f"-{chunk_config['backend']}"
     
     combined_hash = hashlib.sha256() # ye
-    combined_hash.update(file_hash.hexdigest().encode('utf-8')) # ye file ko 
+    combined_hash.update(file_digest.encode('utf-8')) # ye file ko 
     combined_hash.update(config_string.encode('utf-8')) # 
     
     return combined_hash.hexdigest()
 
-def is_cache_valid(pdf_path: str, chunk_size: int, chunk_overlap: int, embedding_model: str) -> bool:
+def corpus_key(pdf_path: str) -> str:
     """
-    Checks if a valid cache exists by comparing fingerprints.
+    Returns the key a PDF is stored under in the corpus manifest (and in the chunks' 'source' metadata).
+    """
+    return os.path.normpath(pdf_path)
+
+def load_manifest() -> dict:
+    """
+    Loads the corpus manifest. Each ingested file has its own entry under "files".
+    The old single-file format is migrated on the fly (its chunk IDs are unknown, so they are stored as None).
     """
-    chunk_config = {"size": chunk_size, "overlap": chunk_overlap}
-    current_fingerprint = _generate_fingerprint(pdf_path, chunk_config, embedding_model)
-    
     if not os.path.exists(CACHE_MASTER_FILE):
-        return False
+        return {"files": {}}
 
     with open(CACHE_MASTER_FILE, "r") as f:
         try:
             cache_data = json.load(f)
         except json.JSONDecodeError:
-            return False # Corrupt JSON
-            
-    saved_fingerprint = cache_data.get("fingerprint")
+            return {"files": {}} # Corrupt JSON
+
+    if "files" in cache_data:
+        return cache_data
+
+    # Old format: one fingerprint for one source_pdf
+    if "fingerprint" in cache_data and "source_pdf" in cache_data:
+        entry = dict(cache_data, chunk_ids=None)
+        return {"files": {corpus_key(cache_data["source_pdf"]): entry}}
+    return {"files": {}}
+
+def save_manifest(manifest: dict):
+    """
+    Writes the corpus manifest to the master cache file.
+    """
+    with open(CACHE_MASTER_FILE, "w") as f:
+        json.dump(manifest, f, indent=2)
+
+def get_file_entry(pdf_path: str):
+    """
+    Returns the manifest entry of a file, or None if the file was never ingested.
+    """
+    return load_manifest()["files"].get(corpus_key(pdf_path))
+
+def corpus_fingerprint(pdf_path: str = None) -> str:
+    """
+    Returns a fingerprint of the indexed corpus as recorded in the manifest.
+    With pdf_path, only that file's fingerprint is used (retrieval scoped to one file).
+    """
+    files = load_manifest()["files"]
+    if pdf_path is not None:
+        entry = files.get(corpus_key(pdf_path))
+        return entry.get("fingerprint") if entry else None
+    combined_hash = hashlib.sha256()
+    for key in sorted(files):
+        combined_hash.update(f"{key}:{files[key].get('fingerprint')}".encode('utf-8'))
+    return combined_hash.hexdigest()
+
+def is_cache_valid(pdf_path: str, chunk_size: int, chunk_overlap: int, embedding_model: str, pdf_backend: str = "pypdf") -> bool:
+    """
+    Checks if a valid cache exists for this file by comparing fingerprints.
+    """
+    chunk_config = {"size": chunk_size, "overlap": chunk_overlap, "backend": pdf_backend}
+    current_fingerprint = _generate_fingerprint(pdf_path, chunk_config, embedding_model)
+
+    entry = get_file_entry(pdf_path)
+    if entry is None:
+        return False
+
+    saved_fingerprint = entry.get("fingerprint")
     
     return saved_fingerprint == current_fingerprint and os.path.exists(VECTOR_DB_DIR)
 
-def save_cache_metadata(pdf_path: str, chunk_size: int, chunk_overlap: int, embedding_model: str):
+def save_cache_metadata(pdf_path: str, chunk_size: int, chunk_overlap: int, embedding_model: str, chunk_ids: list = None, embed_stats: dict = None, pdf_backend: str = "pypdf"):
     """
-    Saves the new metadata to the master cache file after a successful build.
+    Saves the file's metadata to the corpus manifest after a successful build.
+    Entries of the other files are kept. embed_stats records how many embeddings the last build reused/computed.
     """
-    chunk_config = {"size": chunk_size, "overlap": chunk_overlap}
+    chunk_config = {"size": chunk_size, "overlap": chunk_overlap, "backend": pdf_backend}
     current_fingerprint = _generate_fingerprint(pdf_path, chunk_config, embedding_model)
     
-    new_cache_data = {
+    manifest = load_manifest()
+    manifest["files"][corpus_key(pdf_path)] = {
         "fingerprint": current_fingerprint,
         "source_pdf": os.path.basename(pdf_path),
         "embedding_model": embedding_model,
         "chunk_config": chunk_config,
+        "chunk_ids": chunk_ids,
+        "last_build": embed_stats,
     }
-    with open(CACHE_MASTER_FILE, "w") as f:
-        json.dump(new_cache_data, f, indent=2)
-    print(f"💾 Saved new cache metadata to: {CACHE_MASTER_FILE}")
+    save_manifest(manifest)
+    print(f"💾 Saved cache metadata for '{corpus_key(pdf_path)}' to: {CACHE_MASTER_FILE}")
+
+def remove_cache_metadata(pdf_path: str):
+    """
+    Drops a file's entry from the corpus manifest.
+    """
+    manifest = load_manifest()
+    if manifest["files"].pop(corpus_key(pdf_path), None) is not None:
+        save_manifest(manifest)
+        print(f"🗑️ Removed '{corpus_key(pdf_path)}' from: {CACHE_MASTER_FILE}")
 
 def clear_db_and_cache_metadata():
     """
@@ -76,6 +161,84 @@ def clear_db_and_cache_metadata():
         print(f"🗑️ Deleting old cache metadata file: {CACHE_MASTER_FILE}")
         os.remove(CACHE_MASTER_FILE)
 
+def _chunk_cache_path(file_digest: str, chunk_size: int, chunk_overlap: int, pdf_backend: str) -> str:
+    extension = "jsonl.zst" if zstandard else "jsonl.gz"
+    return os.path.join(CHUNK_CACHE_DIR, f"{file_digest}-{chunk_size}-{chunk_overlap}-{pdf_backend}.{extension}")
+
+def _open_compressed(path: str, mode: str, use_zstd: bool):
+    if use_zstd:
+        raw = open(path, mode + "b")
+        if mode == "r":
+            stream = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+        else:
+            stream = zstandard.ZstdCompressor(level=10).stream_writer(raw, closefd=True)
+        return io.TextIOWrapper(stream, encoding="utf-8")
+    return gzip.open(path, mode + "t", encoding="utf-8")
+
+def iter_cached_chunks(pdf_path: str, chunk_size: int, chunk_overlap: int, pdf_backend: str = "pypdf"):
+    """
+    Returns an iterator over the cached split chunks of this exact file and splitter config, or None on a miss.
+    Chunks come back with their 'page' metadata; 'source' is set to the current path.
+    """
+    file_digest = file_sha256(pdf_path)
+    if file_digest is None:
+        return None
+    path = _chunk_cache_path(file_digest, chunk_size, chunk_overlap, pdf_backend)
+    if not os.path.exists(path):
+        return None
+    os.utime(path) # mark as recently used for eviction
+
+    def read_chunks():
+        with _open_compressed(path, "r", path.endswith(".zst")) as f:
+            for line in f:
+                record = json.loads(line)
+                yield Document(page_content=record["text"], metadata=dict(record["metadata"], source=pdf_path))
+
+    print(f"📦 Using cached chunks for: {pdf_path}")
+    return read_chunks()
+
+def write_through_chunk_cache(pdf_path: str, chunk_size: int, chunk_overlap: int, chunks, pdf_backend: str = "pypdf"):
+    """
+    Passes chunks through unchanged while writing them to the chunk cache.
+    The cache file is only published once the iterator is fully consumed, so a partial parse is never cached.
+    """
+    file_digest = file_sha256(pdf_path)
+    if file_digest is None:
+        yield from chunks
+        return
+    os.makedirs(CHUNK_CACHE_DIR, exist_ok=True)
+    path = _chunk_cache_path(file_digest, chunk_size, chunk_overlap, pdf_backend)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with _open_compressed(tmp_path, "w", path.endswith(".zst")) as f:
+            for doc in chunks:
+                f.write(json.dumps({"text": doc.page_content, "metadata": doc.metadata}) + "\n")
+                yield doc
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    _evict_chunk_cache()
+
+def _evict_chunk_cache(max_bytes: int = MAX_CHUNK_CACHE_BYTES):
+    """
+    Deletes the least recently used chunk cache files until the directory fits in max_bytes.
+    """
+    entries = []
+    for name in os.listdir(CHUNK_CACHE_DIR):
+        if name.endswith(".tmp"):
+            continue
+        path = os.path.join(CHUNK_CACHE_DIR, name)
+        stat = os.stat(path)
+        entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        os.remove(path)
+        total -= size
+        print(f"🗑️ Evicted chunk cache file: {path}")
+
 
 # import os
 # import json
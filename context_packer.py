@@ -0,0 +1,130 @@
+# context_packer.py
+import logging
+import threading
+from typing import Any, Callable
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from tokens import count_tokens
+
+CONTEXT_TOKEN_BUDGET = 3000
+MIN_OVERLAP_CHARS = 40  # shortest shared text that counts as a chunk overlap
+MIN_TRIMMED_TOKENS = 50  # don't bother adding a truncated chunk smaller than this
+
+logger = logging.getLogger("langchain.retrieval.multi_query")
+
+
+def _merge_overlapping(first: str, second: str):
+    """
+    Returns first + second without their shared text if second continues where first ends
+    (the splitter's chunk_overlap), otherwise None.
+    """
+    probe = second[:MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return None
+    start = first.find(probe)
+    while start != -1:
+        shared = first[start:]
+        if second.startswith(shared):
+            return first + second[len(shared):]
+        start = first.find(probe, start + 1)
+    return None
+
+
+def merge_adjacent_chunks(documents: list) -> list:
+    """
+    Merges chunks from the same page that share the splitter's chunk_overlap into one chunk,
+    so the shared text is only sent once. Order is preserved.
+    """
+    merged = []
+    for doc in documents:
+        for i, kept in enumerate(merged):
+            same_page = (
+                kept.metadata.get("source") == doc.metadata.get("source")
+                and kept.metadata.get("page") == doc.metadata.get("page")
+            )
+            if not same_page:
+                continue
+            text = _merge_overlapping(kept.page_content, doc.page_content) or _merge_overlapping(doc.page_content, kept.page_content)
+            if text is not None:
+                # The merged chunk keeps the better (earlier) rank
+                merged[i] = Document(id=kept.id, page_content=text, metadata=kept.metadata)
+                break
+        else:
+            merged.append(doc)
+    return merged
+
+
+class ContextPacker:
+    """
+    Assembles the stuff-chain context within a token budget:
+    keeps the retriever's ranking, merges overlapping chunks from the same page into one,
+    adds chunks until the budget is used up (truncating the last one) and records the tokens saved per query.
+    """
+
+    def __init__(self, token_budget: int = CONTEXT_TOKEN_BUDGET, token_counter: Callable[[str], int] = count_tokens):
+        self.token_budget = token_budget
+        self.token_counter = token_counter
+        self.records = []
+        self._lock = threading.Lock()
+
+    def merge_adjacent(self, documents: list) -> list:
+        return merge_adjacent_chunks(documents)
+
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        # Cut proportionally, then shrink until it fits
+        cut = int(len(text) * max_tokens / max(1, self.token_counter(text)))
+        while cut > 0 and self.token_counter(text[:cut]) > max_tokens:
+            cut = int(cut * 0.9)
+        return text[:cut]
+
+    def pack(self, documents: list, query: str = None) -> list:
+        tokens_before = sum(self.token_counter(doc.page_content) for doc in documents)
+        packed = []
+        used = 0
+        for doc in self.merge_adjacent(documents):
+            tokens = self.token_counter(doc.page_content)
+            remaining = self.token_budget - used
+            if tokens <= remaining:
+                packed.append(doc)
+                used += tokens
+                continue
+            if remaining >= MIN_TRIMMED_TOKENS:
+                text = self._truncate(doc.page_content, remaining)
+                packed.append(Document(id=doc.id, page_content=text, metadata=doc.metadata))
+                used += self.token_counter(text)
+            break
+
+        record = {
+            "query": query,
+            "chunks_before": len(documents),
+            "chunks_after": len(packed),
+            "tokens_before": tokens_before,
+            "tokens_after": used,
+            "tokens_saved": tokens_before - used,
+        }
+        with self._lock:
+            self.records.append(record)
+        logger.info(
+            "Packed context: %d -> %d chunks, %d -> %d tokens (saved %d)",
+            record["chunks_before"], record["chunks_after"], tokens_before, used, record["tokens_saved"],
+        )
+        return packed
+
+    def total_tokens_saved(self) -> int:
+        with self._lock:
+            return sum(record["tokens_saved"] for record in self.records)
+
+
+class PackedRetriever(BaseRetriever):
+    """
+    Wraps a retriever and passes its results through a ContextPacker before they reach the stuff chain.
+    """
+
+    base_retriever: BaseRetriever
+    packer: Any
+
+    def _get_relevant_documents(self, query: str, *, run_manager):
+        documents = self.base_retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        return self.packer.pack(documents, query)
@@ -0,0 +1,167 @@
+# embedding_cache.py
+import hashlib
+import inspect
+import sqlite3
+import threading
+import time
+from array import array
+
+from langchain_core.embeddings import Embeddings
+
+from tracing import span
+
+EMBEDDING_CACHE_FILE = "embedding_cache.sqlite3"
+MAX_CACHED_EMBEDDINGS = 200_000  # ~600 MB for 768-dim float32 vectors
+
+
+class SQLiteEmbeddingStore:
+    """
+    On-disk embedding store keyed by (namespace, text hash).
+    Vectors are stored as float32 blobs; the least recently used rows are evicted once max_entries is reached.
+    """
+
+    def __init__(self, path: str = EMBEDDING_CACHE_FILE, max_entries: int = MAX_CACHED_EMBEDDINGS):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                namespace TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (namespace, text_hash)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get_many(self, namespace: str, hashes: list) -> dict:
+        """Returns {text_hash: vector} for the hashes that are stored, and marks them as recently used."""
+        found = {}
+        unique_hashes = list(dict.fromkeys(hashes))
+        with self._lock:
+            # SQLite limits the number of bound parameters, so look up in slices
+            for start in range(0, len(unique_hashes), 500):
+                batch = unique_hashes[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE namespace = ? AND text_hash IN ({placeholders})",
+                    [namespace, *batch],
+                ).fetchall()
+                for text_hash, blob in rows:
+                    found[text_hash] = array("f", blob).tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE namespace = ? AND text_hash = ?",
+                    [(now, namespace, text_hash) for text_hash in found],
+                )
+                self._conn.commit()
+        return found
+
+    def put_many(self, namespace: str, items: dict):
+        """Stores {text_hash: vector} and evicts the least recently used rows above max_entries."""
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (namespace, text_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                [(namespace, text_hash, array("f", vector).tobytes(), now) for text_hash, vector in items.items()],
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (overflow,),
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps any LangChain Embeddings with a persistent, content-addressed cache.
+    Document and query vectors are cached separately because some models (e.g. Google's) embed them with different task types.
+    Set rate_limiter (a rate_limit.TokenBucket) to make uncached query embeddings wait for a token;
+    document embeddings are rate limited by the ingestion pipeline.
+    """
+
+    def __init__(self, underlying: Embeddings, model_name: str, store: SQLiteEmbeddingStore = None):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.store = store if store is not None else SQLiteEmbeddingStore()
+        self.rate_limiter = None
+        self.hits = 0
+        self.misses = 0
+
+    def _acquire(self):
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+
+    def _lookup_or_embed(self, namespace: str, texts: list, embed_fn) -> list:
+        hashes = [self.store.text_hash(text) for text in texts]
+        cached = self.store.get_many(namespace, hashes)
+
+        missing = {}
+        for text_hash, text in zip(hashes, texts):
+            if text_hash not in cached and text_hash not in missing:
+                missing[text_hash] = text
+
+        miss_count = sum(1 for text_hash in hashes if text_hash not in cached)
+        self.hits += len(texts) - miss_count
+        self.misses += miss_count
+
+        if missing:
+            with span("embeddings.embed", namespace=namespace, texts=len(missing), cache_hits=len(texts) - miss_count):
+                vectors = embed_fn(list(missing.values()))
+            computed = {text_hash: array("f", vector).tolist() for text_hash, vector in zip(missing.keys(), vectors)}
+            self.store.put_many(namespace, computed)
+            cached.update(computed)
+
+        return [cached[text_hash] for text_hash in hashes]
+
+    def embed_documents(self, texts: list) -> list:
+        return self._lookup_or_embed(f"{self.model_name}:document", texts, self.underlying.embed_documents)
+
+    def embed_query(self, text: str) -> list:
+        return self._lookup_or_embed(
+            f"{self.model_name}:query", [text], lambda texts: [self._embed_one_query(texts[0])]
+        )[0]
+
+    def embed_queries(self, texts: list) -> list:
+        """
+        Embeds several queries at once. Uncached ones go to the model in a single batch
+        when it supports a query task type (Google does), otherwise one by one.
+        """
+        return self._lookup_or_embed(f"{self.model_name}:query", texts, self._embed_query_batch)
+
+    def _embed_one_query(self, text: str) -> list:
+        self._acquire()
+        return self.underlying.embed_query(text)
+
+    def _embed_query_batch(self, texts: list) -> list:
+        if "task_type" in inspect.signature(self.underlying.embed_documents).parameters:
+            self._acquire()
+            return self.underlying.embed_documents(texts, task_type="retrieval_query")
+        return [self._embed_one_query(text) for text in texts]
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
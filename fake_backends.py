@@ -0,0 +1,164 @@
+# fake_backends.py
+import hashlib
+import os
+import re
+import time
+from typing import Any, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from router import WEB_CUES
+
+# The backends can be picked in config.py (optional there) and overridden from the environment
+try:
+    from config import LLM_BACKEND as CONFIG_LLM_BACKEND
+except ImportError:
+    CONFIG_LLM_BACKEND = "google"
+try:
+    from config import EMBEDDING_BACKEND as CONFIG_EMBEDDING_BACKEND
+except ImportError:
+    CONFIG_EMBEDDING_BACKEND = "google"
+
+
+def setting(name: str, default):
+    """Reads a backend setting from the environment, falling back to the default."""
+    return type(default)(os.getenv(name, default))
+
+
+LLM_BACKEND = setting("LLM_BACKEND", CONFIG_LLM_BACKEND)  # "google" or "fake"
+EMBEDDING_BACKEND = setting("EMBEDDING_BACKEND", CONFIG_EMBEDDING_BACKEND)  # "google" or "hash"
+FAKE_LLM_LATENCY = setting("FAKE_LLM_LATENCY", 0.3)  # seconds before the first token
+FAKE_LLM_TOKENS_PER_SECOND = setting("FAKE_LLM_TOKENS_PER_SECOND", 80.0)
+FAKE_EMBED_LATENCY = setting("FAKE_EMBED_LATENCY", 0.05)  # seconds per embedding request
+HASH_EMBEDDING_DIM = 768  # same size as models/embedding-001, so the Chroma collection fits either
+
+
+def resolve_embedding_model(embedding_model: str) -> str:
+    """
+    The model name used for fingerprints, chunk IDs and the embedding cache.
+    The hashing backend gets its own name, so its vectors never mix with Google's.
+    """
+    return f"hashing-{HASH_EMBEDDING_DIM}" if EMBEDDING_BACKEND == "hash" else embedding_model
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic local embeddings: word unigrams and bigrams hashed into signed buckets, L2-normalised.
+    Texts sharing words get similar vectors, so retrieval behaves sensibly; each request sleeps `latency` seconds.
+    """
+
+    def __init__(self, dim: int = HASH_EMBEDDING_DIM, latency: float = FAKE_EMBED_LATENCY):
+        self.dim = dim
+        self.latency = latency
+
+    def _embed(self, text: str) -> list:
+        words = re.findall(r"\w+", text.lower())
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: list, task_type: str = None) -> list:
+        time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list:
+        time.sleep(self.latency)
+        return self._embed(text)
+
+
+def _between(text: str, start: str, end: str) -> Optional[str]:
+    match = re.search(re.escape(start) + r"(.*?)" + re.escape(end), text, re.DOTALL)
+    return match.group(1).strip() if match else None
+
+
+def _words(text: str, count: int) -> str:
+    return " ".join(text.split()[:count])
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Deterministic offline chat model that recognises this app's prompts and answers them plausibly:
+    ReAct steps (pick a tool, then give a Final Answer from the observation), MultiQuery expansions,
+    stuff-chain answers from the context, follow-up and intent prompts.
+    Latency is simulated as time to first token plus tokens / tokens_per_second, and streaming is supported.
+    """
+
+    latency: float = FAKE_LLM_LATENCY
+    tokens_per_second: float = FAKE_LLM_TOKENS_PER_SECOND
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-fake"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {"latency": self.latency, "tokens_per_second": self.tokens_per_second}
+
+    def respond(self, prompt: str) -> str:
+        if "Action Input:" in prompt and "Begin!" in prompt:
+            return self._react_step(prompt)
+        if "different versions of the given user" in prompt:
+            question = _between(prompt + "\n", "Original question:", "\n") or ""
+            return f"{question}\nWhat does the document say about {question.rstrip('?')}?\nExplain {question.rstrip('?')}"
+        if "Use the following pieces of context" in prompt:
+            context = prompt.split("----------------", 1)[-1]
+            return f"According to the document, {_words(context, 60)}"
+        if '"intent"' in prompt:
+            question = _between(prompt, "The user then wrote: \"", "\"\n") or ""
+            return '{"intent": "new_question", "question": "%s"}' % question.replace('"', "'")
+        if "answer_to_follow_up" in prompt:
+            return "new_question"
+        if "rephrase the user's short response" in prompt:
+            follow_up = _between(prompt, "A user was asked the following question: \"", "\"\n") or ""
+            return f"Tell me more about this: {follow_up}"
+        if "follow-up question" in prompt:
+            question = _between(prompt, "And the user's question:\n\"\"\"", "\"\"\"") or "this topic"
+            return f"What are the practical implications of: {question.rstrip('?')}?"
+        return f"Scripted reply {hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:8]}."
+
+    def _react_step(self, prompt: str) -> str:
+        tools = [name.strip() for name in (_between(prompt, "should be one of [", "]") or "").split(",") if name.strip()]
+        scratchpad = prompt.split("Begin!", 1)[-1]
+        question = _between(scratchpad, "Question:", "\nThought:") or ""
+        if "Observation:" in scratchpad:
+            observation = scratchpad.rsplit("Observation:", 1)[-1].split("\nThought:", 1)[0]
+            return f" I now know the final answer.\nFinal Answer: {_words(observation, 80)}"
+        web_tools = [tool for tool in tools if "web" in tool.lower() or "search" in tool.lower()]
+        tool = web_tools[0] if web_tools and WEB_CUES.search(question) else (tools[0] if tools else "Document QA System")
+        return f" I should use {tool} to answer this.\nAction: {tool}\nAction Input: {question}"
+
+    @staticmethod
+    def _prompt(messages: List[BaseMessage]) -> str:
+        return "\n".join(str(message.content) for message in messages)
+
+    @staticmethod
+    def _apply_stop(text: str, stop: Optional[List[str]]) -> str:
+        for token in stop or []:
+            text = text.split(token, 1)[0]
+        return text
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        text = self._apply_stop(self.respond(self._prompt(messages)), stop)
+        time.sleep(self.latency + len(text.split()) / self.tokens_per_second)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        text = self._apply_stop(self.respond(self._prompt(messages)), stop)
+        time.sleep(self.latency)
+        for token in re.findall(r"\S+\s*|\s+", text):
+            time.sleep(1 / self.tokens_per_second)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
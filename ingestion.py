@@ -0,0 +1,159 @@
+# ingestion.py
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from rate_limit import TokenBucket
+from tracing import span
+
+EMBED_BATCH_SIZE = 64
+EMBED_MAX_WORKERS = 4
+EMBED_REQUESTS_PER_MINUTE = 120
+EMBED_MAX_RETRIES = 6
+CHECKPOINT_FILE = "ingest_checkpoint.json"
+
+
+class IngestionCheckpoint:
+    """
+    Records the chunk IDs of every batch that was embedded and upserted, per source file.
+    If a build is interrupted, the next run skips these chunks instead of starting over.
+    """
+
+    def __init__(self, path: str = CHECKPOINT_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                try:
+                    self._data = json.load(f)
+                except json.JSONDecodeError:
+                    self._data = {} # Corrupt JSON
+
+    def completed_ids(self, source_key: str) -> set:
+        return set(self._data.get(source_key, []))
+
+    def mark_done(self, source_key: str, chunk_ids: list):
+        with self._lock:
+            self._data.setdefault(source_key, []).extend(chunk_ids)
+            self._save()
+
+    def clear(self, source_key: str):
+        with self._lock:
+            if self._data.pop(source_key, None) is None:
+                return
+            if self._data:
+                self._save()
+            elif os.path.exists(self.path):
+                os.remove(self.path)
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._data, f)
+        os.replace(tmp_path, self.path)
+
+
+def _is_retryable(error: Exception) -> bool:
+    """Rate limits (429 / ResourceExhausted) and transient server or network errors are worth retrying."""
+    text = f"{type(error).__name__} {error}".lower()
+    markers = ("429", "resourceexhausted", "rate limit", "quota", "503", "unavailable", "deadline", "timeout", "connection")
+    return any(marker in text for marker in markers)
+
+
+def _embed_with_retry(embedder, texts: list, limiter: TokenBucket, max_retries: int) -> list:
+    """Embeds one batch, backing off exponentially with full jitter on retryable errors."""
+    for attempt in range(max_retries + 1):
+        limiter.acquire()
+        try:
+            return embedder.embed_documents(texts)
+        except Exception as e:
+            if attempt == max_retries or not _is_retryable(e):
+                raise
+            delay = random.uniform(0, min(60.0, 2 ** attempt))
+            print(f"⏳ Embedding batch failed ({e}); retrying in {delay:.1f}s (attempt {attempt + 1}/{max_retries})")
+            time.sleep(delay)
+
+
+def iter_batches(iterable, size: int):
+    """Yields lists of up to `size` items from any iterable without materialising it."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def embed_and_upsert_stream(
+    vectordb,
+    pairs,
+    source_key: str = None,
+    batch_size: int = EMBED_BATCH_SIZE,
+    max_workers: int = EMBED_MAX_WORKERS,
+    requests_per_minute: int = EMBED_REQUESTS_PER_MINUTE,
+    max_retries: int = EMBED_MAX_RETRIES,
+    checkpoint: IngestionCheckpoint = None,
+) -> int:
+    """
+    Consumes (chunk_id, doc) pairs lazily, embeds them in batches on a bounded thread pool and upserts each finished batch into Chroma.
+    At most 2 * max_workers batches are in flight, so memory stays flat and early chunks are searchable while later ones are still being parsed.
+    Requests are rate limited with a token bucket and retried with jittered backoff.
+    When a checkpoint and source_key are given, completed batches are recorded so an interrupted build can resume.
+    Returns the number of chunks embedded.
+    """
+    embedder = vectordb.embeddings
+    limiter = TokenBucket(requests_per_minute / 60.0, capacity=max_workers)
+    upsert_lock = threading.Lock()
+
+    def run_batch(batch):
+        batch_ids = [chunk_id for chunk_id, _ in batch]
+        batch_docs = [doc for _, doc in batch]
+        with span("ingestion.batch", chunks=len(batch)):
+            vectors = _embed_with_retry(embedder, [doc.page_content for doc in batch_docs], limiter, max_retries)
+            with upsert_lock:
+                vectordb._collection.upsert(
+                    ids=batch_ids,
+                    embeddings=vectors,
+                    metadatas=[doc.metadata for doc in batch_docs],
+                    documents=[doc.page_content for doc in batch_docs],
+                )
+        if checkpoint is not None and source_key is not None:
+            checkpoint.mark_done(source_key, batch_ids)
+        return len(batch_ids)
+
+    done = 0
+
+    def collect(finished):
+        nonlocal done
+        for future in finished:
+            done += future.result()
+            print(f"📦 Embedded {done} chunks so far")
+
+    in_flight = set()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for batch in iter_batches(pairs, batch_size):
+            if len(in_flight) >= max_workers * 2:
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(finished)
+            # Each batch runs in a copy of the caller's context, so its trace spans nest under the build
+            in_flight.add(pool.submit(contextvars.copy_context().run, run_batch, batch))
+        finished, _ = wait(in_flight)
+        collect(finished)
+    return done
+
+
+def embed_and_upsert(vectordb, docs, ids: list = None, **kwargs) -> int:
+    """
+    List-based wrapper around embed_and_upsert_stream. Random IDs are used when none are given.
+    """
+    if ids is None:
+        ids = [str(uuid.uuid4()) for _ in docs]
+    return embed_and_upsert_stream(vectordb, zip(ids, docs), **kwargs)
@@ -0,0 +1,239 @@
+# lexical_index.py
+import os
+import re
+import threading
+from collections import Counter
+
+import numpy as np
+
+LEXICAL_INDEX_FILE = "./lexical_index.npz"  # lives next to ./chroma_db
+BM25_K1 = 1.5
+BM25_B = 0.75
+FAST_PATH_COVERAGE = 1.0  # share of the query's IDF weight the top chunk must contain
+FAST_PATH_MAX_DF = 3  # a query term found in at most this many chunks counts as specific (section number, defined term)
+INDEX_READ_BATCH = 5000
+
+# Section numbers like "302", "12.3" or "4(b)" are kept as single tokens
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.\-/][a-z0-9]+)*(?:\([a-z0-9]+\))*")
+STOPWORDS = frozenset(
+    "a an and are as at be by can did do does for from has have how i if in is it its of on or "
+    "shall should so such that the their them then there these this those to under was were what "
+    "when where which who whom why will with would you your about into any all".split()
+)
+
+
+def tokenize(text: str) -> list:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def _pack_strings(strings) -> np.ndarray:
+    # One newline-separated UTF-8 buffer instead of a fixed-width (padded UTF-32) string array
+    return np.frombuffer("\n".join(strings).encode("utf-8"), dtype=np.uint8)
+
+
+def _unpack_strings(buffer: np.ndarray, count: int) -> np.ndarray:
+    if count == 0:
+        return np.asarray([], dtype=str)
+    return np.asarray(buffer.tobytes().decode("utf-8").split("\n"), dtype=str)
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over the chunks in the vector database, persisted as compact numpy arrays:
+    postings are stored per term (CSR layout: offsets -> chunk numbers + term frequencies),
+    so a query touches only the postings of its own terms and needs no embedding call.
+    """
+
+    def __init__(self, terms, offsets, postings, frequencies, chunk_ids, sources, lengths):
+        self.terms = terms
+        self.offsets = offsets
+        self.postings = postings
+        self.frequencies = frequencies
+        self.chunk_ids = chunk_ids
+        self.sources = sources
+        self.lengths = lengths
+        self.fast_path_hits = 0
+        self._lock = threading.Lock()
+        self._term_ids = {term: i for i, term in enumerate(terms.tolist())}
+        self._avg_length = float(lengths.mean()) if len(lengths) else 0.0
+        document_frequency = np.diff(offsets).astype(np.float32)
+        self._idf = np.log1p((len(chunk_ids) - document_frequency + 0.5) / (document_frequency + 0.5))
+        self._max_idf = float(np.log1p((len(chunk_ids) + 0.5) / 0.5))
+
+    def __len__(self):
+        return len(self.chunk_ids)
+
+    @classmethod
+    def build(cls, chunk_ids: list, texts: list, sources: list) -> "LexicalIndex":
+        term_ids = {}
+        rows_term, rows_chunk, rows_freq = [], [], []
+        lengths = np.zeros(len(texts), dtype=np.int32)
+        for chunk_number, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths[chunk_number] = len(tokens)
+            for term, freq in Counter(tokens).items():
+                rows_term.append(term_ids.setdefault(term, len(term_ids)))
+                rows_chunk.append(chunk_number)
+                rows_freq.append(freq)
+
+        rows_term = np.asarray(rows_term, dtype=np.int32)
+        order = np.argsort(rows_term, kind="stable")  # stable: postings stay sorted by chunk number
+        offsets = np.zeros(len(term_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows_term, minlength=len(term_ids)), out=offsets[1:])
+        return cls(
+            terms=np.asarray(list(term_ids), dtype=str),  # ids were handed out in insertion order
+            offsets=offsets,
+            postings=np.asarray(rows_chunk, dtype=np.int32)[order],
+            frequencies=np.minimum(np.asarray(rows_freq, dtype=np.int32), np.iinfo(np.uint16).max).astype(np.uint16)[order],
+            chunk_ids=np.asarray(chunk_ids, dtype=str),
+            sources=np.asarray(sources, dtype=str),
+            lengths=lengths,
+        )
+
+    @classmethod
+    def build_from_vectordb(cls, vectordb) -> "LexicalIndex":
+        """Reads every chunk text from the Chroma collection (local, no API calls) and indexes it."""
+        chunk_ids, texts, sources = [], [], []
+        offset = 0
+        while True:
+            batch = vectordb.get(include=["documents", "metadatas"], limit=INDEX_READ_BATCH, offset=offset)
+            if not batch["ids"]:
+                break
+            chunk_ids.extend(batch["ids"])
+            texts.extend(text or "" for text in batch["documents"])
+            sources.extend((metadata or {}).get("source", "") for metadata in batch["metadatas"])
+            offset += len(batch["ids"])
+        return cls.build(chunk_ids, texts, sources)
+
+    def save(self, path: str = LEXICAL_INDEX_FILE):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                terms=_pack_strings(self.terms.tolist()),
+                chunk_ids=_pack_strings(self.chunk_ids.tolist()),
+                sources=_pack_strings(self.sources.tolist()),
+                offsets=self.offsets,
+                postings=self.postings,
+                frequencies=self.frequencies,
+                lengths=self.lengths,
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = LEXICAL_INDEX_FILE):
+        """Returns the saved index, or None if there is none (or it can't be read)."""
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                offsets, lengths = data["offsets"], data["lengths"]
+                return cls(
+                    terms=_unpack_strings(data["terms"], len(offsets) - 1),
+                    offsets=offsets,
+                    postings=data["postings"],
+                    frequencies=data["frequencies"],
+                    chunk_ids=_unpack_strings(data["chunk_ids"], len(lengths)),
+                    sources=_unpack_strings(data["sources"], len(lengths)),
+                    lengths=lengths,
+                )
+        except (OSError, ValueError, KeyError, UnicodeDecodeError) as e:
+            print(f"⚠️ Could not read the lexical index ({e}), it will be rebuilt.")
+            return None
+
+    def _scores(self, query_terms: list, where: dict = None):
+        scores = np.zeros(len(self.chunk_ids), dtype=np.float32)
+        for term_id in query_terms:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            chunks = self.postings[start:end]
+            tf = self.frequencies[start:end].astype(np.float32)
+            norm = 1 - BM25_B + BM25_B * self.lengths[chunks] / max(self._avg_length, 1e-9)
+            scores[chunks] += self._idf[term_id] * tf * (BM25_K1 + 1) / (tf + BM25_K1 * norm)
+        if where:
+            scores[self.sources != where["source"]] = 0
+        return scores
+
+    @staticmethod
+    def supports_filter(where: dict) -> bool:
+        """Only the {"source": ...} filter used by the app can be applied to the index."""
+        return not where or (set(where) == {"source"} and isinstance(where["source"], str))
+
+    def search(self, query: str, k: int, where: dict = None) -> list:
+        """
+        Returns up to k (chunk_id, bm25_score) pairs, best first.
+        """
+        if not len(self.chunk_ids):
+            return []
+        query_terms = sorted({self._term_ids[t] for t in tokenize(query) if t in self._term_ids})
+        if not query_terms:
+            return []
+        scores = self._scores(query_terms, where)
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(str(self.chunk_ids[i]), float(scores[i])) for i in matched]
+
+    def _coverage(self, query: str, chunk_id: str) -> tuple:
+        """Returns (share of the query's IDF weight found in the chunk, whether a matched term is specific)."""
+        tokens = set(tokenize(query))
+        positions = np.flatnonzero(self.chunk_ids == chunk_id)
+        if not tokens or not len(positions):
+            return 0.0, False
+        chunk = int(positions[0])
+        total = matched = 0.0
+        specific = False
+        for token in tokens:
+            term_id = self._term_ids.get(token)
+            weight = self._max_idf if term_id is None else float(self._idf[term_id])
+            total += weight
+            if term_id is None:
+                continue
+            postings = self.postings[self.offsets[term_id]:self.offsets[term_id + 1]]
+            position = np.searchsorted(postings, chunk)
+            if position < len(postings) and postings[position] == chunk:
+                matched += weight
+                specific = specific or len(postings) <= FAST_PATH_MAX_DF
+        return matched / total, specific
+
+    def coverage(self, query: str, chunk_id: str) -> float:
+        """Share of the query's IDF weight (unknown terms count as the rarest) that the chunk contains."""
+        return self._coverage(query, chunk_id)[0]
+
+    def is_strong_match(self, query: str, hits: list) -> bool:
+        """
+        True when the best chunk contains all of the query's terms (by IDF weight) and at least one of them is specific,
+        i.e. found in only a few chunks, e.g. a section number or a defined term.
+        Dense retrieval adds little for such queries, while the margin over the runner-up isn't meaningful
+        because the overlapping neighbour chunk usually scores about the same.
+        """
+        if not hits:
+            return False
+        coverage, specific = self._coverage(query, hits[0][0])
+        return specific and coverage >= FAST_PATH_COVERAGE - 1e-6
+
+    def record_fast_path(self):
+        with self._lock:
+            self.fast_path_hits += 1
+
+
+def rebuild_lexical_index(vectordb, path: str = LEXICAL_INDEX_FILE) -> LexicalIndex:
+    """Rebuilds and saves the index after the collection changed (ingestion or removal)."""
+    index = LexicalIndex.build_from_vectordb(vectordb)
+    index.save(path)
+    print(f"🔤 Lexical index saved: {len(index)} chunks, {len(index.terms)} terms -> {path}")
+    return index
+
+
+def load_or_build_lexical_index(vectordb, path: str = LEXICAL_INDEX_FILE) -> LexicalIndex:
+    """Loads the saved index, building it once from the collection if it is missing or out of date."""
+    index = LexicalIndex.load(path)
+    if index is None or len(index) != vectordb._collection.count():
+        index = rebuild_lexical_index(vectordb, path)
+    return index
+
+
+def remove_lexical_index(path: str = LEXICAL_INDEX_FILE):
+    if os.path.exists(path):
+        print(f"🗑️ Deleting old lexical index: {path}")
+        os.remove(path)
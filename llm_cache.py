@@ -0,0 +1,99 @@
+# llm_cache.py
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, Generation
+
+LLM_CACHE_FILE = "llm_cache.sqlite3"
+MAX_CACHED_RESPONSES = 20_000
+CACHED_CLASSES = [Generation, ChatGeneration, ChatGenerationChunk, AIMessage, AIMessageChunk]  # all loads() may rebuild
+
+
+class SQLiteLLMCache(BaseCache):
+    """
+    Persistent exact-match prompt -> completion cache for LangChain chat models.
+    Rows are keyed by a hash of the LLM config string (model name, temperature, stop words, ...) and a hash of the prompt.
+    The least recently used rows are evicted once max_entries is reached; hits and misses are counted.
+    """
+
+    def __init__(self, path: str = LLM_CACHE_FILE, max_entries: int = MAX_CACHED_RESPONSES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                llm_hash TEXT NOT NULL,
+                prompt_hash TEXT NOT NULL,
+                response TEXT NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (llm_hash, prompt_hash)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses(last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> tuple:
+        return (
+            hashlib.sha256(llm_string.encode("utf-8")).hexdigest(),
+            hashlib.sha256(prompt.encode("utf-8")).hexdigest(),
+        )
+
+    def lookup(self, prompt: str, llm_string: str):
+        llm_hash, prompt_hash = self._key(prompt, llm_string)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM responses WHERE llm_hash = ? AND prompt_hash = ?",
+                (llm_hash, prompt_hash),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE responses SET last_used = ? WHERE llm_hash = ? AND prompt_hash = ?",
+                (time.time(), llm_hash, prompt_hash),
+            )
+            self._conn.commit()
+        generations = [loads(generation, allowed_objects=CACHED_CLASSES) for generation in json.loads(row[0])]
+        for generation in generations:
+            # Lets callbacks (e.g. tracing) tell cached responses from real LLM calls
+            generation.generation_info = {**(generation.generation_info or {}), "cache_hit": True}
+        return generations
+
+    def update(self, prompt: str, llm_string: str, return_val) -> None:
+        llm_hash, prompt_hash = self._key(prompt, llm_string)
+        response = json.dumps([dumps(generation) for generation in return_val])
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (llm_hash, prompt_hash, response, last_used) VALUES (?, ?, ?, ?)",
+                (llm_hash, prompt_hash, response, time.time()),
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE rowid IN (SELECT rowid FROM responses ORDER BY last_used ASC LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self._conn.commit()
+
+    def clear(self, **kwargs) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
@@ -1,13 +1,85 @@
 # llm_config.py
+import asyncio
+import threading
+from langchain_core.rate_limiters import BaseRateLimiter
 from langchain_google_genai import ChatGoogleGenerativeAI
 from config import API_KEY
+from llm_cache import SQLiteLLMCache
+from rate_limit import TokenBucket
+from fake_backends import LLM_BACKEND, ScriptedChatModel
 
-llm = ChatGoogleGenerativeAI(
-    # model="gemini-2.0-flash-lite",
-    model="gemini-2.5-flash", # wE CAN CHANGE ACC TO OUR NEED 
-    temperature=0.1,
-    google_api_key=API_KEY
-)
+def _build_llm(cache=None):
+    if LLM_BACKEND == "fake":
+        return ScriptedChatModel(cache=cache)
+    return ChatGoogleGenerativeAI(
+        # model="gemini-2.0-flash-lite",
+        model="gemini-2.5-flash", # wE CAN CHANGE ACC TO OUR NEED 
+        temperature=0.1,
+        google_api_key=API_KEY,
+        cache=cache,
+    )
+
+llm = _build_llm()
+
+# Same model behind the persistent prompt -> completion cache. Call sites opt in with get_llm(use_cache=True);
+# it is built on first use, so llm_cache.sqlite3 is only created when the cache is actually on.
+_cached_llm = None
+_cached_llm_lock = threading.Lock()
+_rate_limiter = None
+
+def get_llm(use_cache: bool = False):
+    """
+    Returns the shared chat model, optionally the one backed by the LLM response cache.
+    """
+    global _cached_llm
+    if not use_cache:
+        return llm
+    with _cached_llm_lock:
+        if _cached_llm is None:
+            _cached_llm = _build_llm(cache=SQLiteLLMCache())
+            _cached_llm.rate_limiter = _rate_limiter
+    return _cached_llm
+
+def get_llm_response_cache():
+    """
+    Returns the LLM response cache, or None if no call site has opted in yet.
+    """
+    return _cached_llm.cache if _cached_llm is not None else None
+
+
+class TokenBucketRateLimiter(BaseRateLimiter):
+    """
+    LangChain rate limiter over a shared TokenBucket. LangChain checks it after the response cache,
+    so cache hits never wait for a token.
+    """
+
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        return self.bucket.acquire(blocking)
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        while not self.bucket.acquire(blocking=False):
+            if not blocking:
+                return False
+            await asyncio.sleep(1 / self.bucket.rate)
+        return True
+
+
+def set_rate_limit(requests_per_minute: float = None):
+    """
+    Caps LLM API calls across both shared models and every thread or task using them, e.g. for batch runs.
+    Returns the shared TokenBucket so other API clients (e.g. CachedEmbeddings.rate_limiter for query embeddings)
+    can draw from the same budget. None removes the limit.
+    """
+    global _rate_limiter
+    bucket = TokenBucket(requests_per_minute / 60.0) if requests_per_minute else None
+    _rate_limiter = TokenBucketRateLimiter(bucket) if bucket is not None else None
+    for model in (llm, _cached_llm):
+        if model is not None:
+            model.rate_limiter = _rate_limiter
+    return bucket
 
 
     # document_tool = Tool(
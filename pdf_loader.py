@@ -1,28 +1,124 @@
 # # pdf_loader.py
-from langchain_community.document_loaders import PyPDFLoader
+import math
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from langchain_core.documents import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from config import CHUNK_SIZE, CHUNK_OVERLAP
+from cache_handler import iter_cached_chunks, write_through_chunk_cache
 
-def load_and_split_pdf(path: str, chunk_size: int, chunk_overlap: int):
+PDF_BACKENDS = ("pypdf", "pymupdf")
+DEFAULT_PDF_BACKEND = "pypdf"
+DEFAULT_PDF_WORKERS = 1
+
+def _page_count(path: str, backend: str) -> int:
+    if backend == "pymupdf":
+        import pymupdf
+        with pymupdf.open(path) as pdf:
+            return pdf.page_count
+    from pypdf import PdfReader
+    return len(PdfReader(path).pages)
+
+def _iter_page_range(path: str, backend: str, start: int, stop: int):
+    """
+    Lazily yields pages [start, stop) as one Document per page, with 'source' and 'page' metadata.
+    """
+    if backend == "pymupdf":
+        import pymupdf
+        with pymupdf.open(path) as pdf:
+            for page_number in range(start, stop):
+                text = pdf[page_number].get_text().strip()
+                metadata = {"source": path, "page": page_number, "total_pages": pdf.page_count}
+                yield Document(page_content=text, metadata=metadata)
+        return
+
+    from pypdf import PdfReader
+    reader = PdfReader(path)
+    for page_number in range(start, stop):
+        # Same extraction as PyPDFLoader, so chunk texts (and chunk IDs) don't change
+        text = reader.pages[page_number].extract_text(extraction_mode="plain").strip()
+        metadata = {
+            "source": path,
+            "page": page_number,
+            "page_label": reader.page_labels[page_number],
+            "total_pages": len(reader.pages),
+        }
+        yield Document(page_content=text, metadata=metadata)
+
+def _extract_page_range(path: str, backend: str, start: int, stop: int) -> list:
+    """
+    Extracts pages [start, stop) as a list. Top-level so it can run in a worker process.
+    """
+    return list(_iter_page_range(path, backend, start, stop))
+
+def iter_pdf_pages(path: str, backend: str = DEFAULT_PDF_BACKEND, workers: int = DEFAULT_PDF_WORKERS):
+    """
+    Yields the PDF's pages in page order using the chosen backend ("pypdf" or "pymupdf").
+    With workers > 1, page ranges are extracted on a process pool; only a few ranges are in flight at a time.
+    """
+    if backend not in PDF_BACKENDS:
+        raise ValueError(f"Unknown PDF backend '{backend}'. Choose one of: {', '.join(PDF_BACKENDS)}")
+    if not os.path.isfile(path):
+        raise ValueError(f"File path {path} is not a valid file")
+
+    total_pages = _page_count(path, backend)
+    if workers <= 1:
+        yield from _iter_page_range(path, backend, 0, total_pages)
+        return
+
+    # Several small ranges per worker keep the pool busy and results streaming
+    pages_per_range = max(1, math.ceil(total_pages / (workers * 4)))
+    ranges = [(start, min(start + pages_per_range, total_pages)) for start in range(0, total_pages, pages_per_range)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = deque()
+        for start, stop in ranges:
+            if len(in_flight) >= workers * 2:
+                yield from in_flight.popleft().result()
+            in_flight.append(pool.submit(_extract_page_range, path, backend, start, stop))
+        while in_flight:
+            yield from in_flight.popleft().result()
+
+def _split_pages(path: str, chunk_size: int, chunk_overlap: int, backend: str, workers: int):
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap
+    )
+    for page in iter_pdf_pages(path, backend, workers):
+        yield from splitter.split_documents([page])
+
+def iter_split_pdf(path: str, chunk_size: int, chunk_overlap: int, backend: str = DEFAULT_PDF_BACKEND, workers: int = DEFAULT_PDF_WORKERS, use_cache: bool = True):
+    """
+    Generator that parses the PDF one page at a time and yields that page's chunks.
+    Only the current page (or the few page ranges in flight) is held in memory, however long the document is.
+    With use_cache, chunks of a file already split with the same config are read from the chunk cache
+    (keyed by file SHA-256, chunk_size, chunk_overlap and backend) instead of parsing the PDF again.
+    """
+    if not use_cache:
+        yield from _split_pages(path, chunk_size, chunk_overlap, backend, workers)
+        return
+
+    cached = iter_cached_chunks(path, chunk_size, chunk_overlap, backend)
+    if cached is not None:
+        yield from cached
+        return
+    chunks = _split_pages(path, chunk_size, chunk_overlap, backend, workers)
+    yield from write_through_chunk_cache(path, chunk_size, chunk_overlap, chunks, backend)
+
+def load_and_split_pdf(path: str, chunk_size: int, chunk_overlap: int, backend: str = DEFAULT_PDF_BACKEND, workers: int = DEFAULT_PDF_WORKERS, use_cache: bool = True):
     """
     Loads a PDF and splits it into chunks based on the provided settings.
     Handles cases where the file is not found.
+    Thin list-returning wrapper around iter_split_pdf.
     """
     try:
         print(f"📄 Loading and splitting PDF from: {path}")
-        loader = PyPDFLoader(path)
-        docs = loader.load()
-
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap
-        )
-        split_docs = splitter.split_documents(docs)
+        split_docs = list(iter_split_pdf(path, chunk_size, chunk_overlap, backend, workers, use_cache))
         print(f"✅ PDF split into {len(split_docs)} chunks.")
         return split_docs
         
     except ValueError as e:
-        # This catches the error from PyPDFLoader when the path is invalid.
+        # This catches the error when the path is invalid.
         print(f"❌ Error: The file path '{path}' is not valid or the file could not be accessed.") 
         print(f"   (Underlying error: {e})") 
         return None
@@ -1,30 +1,342 @@
 # qa_chain.py
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
 from langchain.chains import RetrievalQA 
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.runnables.config import run_in_executor
+from langchain_core.vectorstores import VectorStoreRetriever
 from langchain.retrievers.multi_query import MultiQueryRetriever
-from llm_config import llm
+from llm_config import get_llm
+from answer_cache import CachedQAChain
+from context_packer import ContextPacker, PackedRetriever, CONTEXT_TOKEN_BUDGET, merge_adjacent_chunks
+from tracing import span
 import logging 
 
 logging.basicConfig() # 
 logging.getLogger("langchain.retrieval.multi_query").setLevel(logging.INFO) 
+logger = logging.getLogger("langchain.retrieval.multi_query")
 
-def get_qa_chain(vectordb, k=12, chain_type="stuff"): 
+EXPANSION_CACHE_FILE = "expansion_cache.json"
+MAX_CACHED_EXPANSIONS = 2000
+EXPANSION_MODES = ("off", "cached", "always")
+DEFAULT_EXPANSION_MODE = "always"
+DEDUP_SIMILARITY = 0.8  # shingle containment above which two chunks count as the same text
+RRF_K = 60  # reciprocal rank fusion damping constant
+
+def normalize_question(question: str) -> str:
+    """
+    Lowercases, collapses whitespace and drops trailing punctuation so trivial variants share a cache entry.
+    """
+    return re.sub(r"\s+", " ", question).strip().rstrip("?!. ").lower()
+
+def _shingles(text: str, size: int = 3) -> set:
+    words = text.lower().split()
+    return {tuple(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+
+def interleave(result_lists: list) -> list:
+    """
+    Merges ranked result lists round-robin (every query's best hit first, then every second hit, ...).
+    """
+    merged = []
+    for rank in range(max((len(results) for results in result_lists), default=0)):
+        merged.extend(results[rank] for results in result_lists if rank < len(results))
+    return merged
+
+def reciprocal_rank_fusion(result_lists: list, k: int = RRF_K) -> list:
+    """
+    Fuses ranked result lists (e.g. dense and lexical hits) by summing 1 / (k + rank) per chunk.
+    Scores from different retrievers never have to be compared directly.
+    """
+    scores = {}
+    documents = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results):
+            key = doc.id or (doc.metadata.get("source"), doc.metadata.get("page"), doc.page_content)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
+            documents.setdefault(key, doc)
+    return [documents[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+def dedupe_documents(documents: list, threshold: float = DEDUP_SIMILARITY) -> list:
+    """
+    Drops repeated chunks (same chunk ID) and near-duplicates whose word 3-gram containment in an
+    already kept chunk is at or above threshold, then merges neighbouring chunks that share only the
+    splitter's chunk_overlap (see context_packer.merge_adjacent_chunks).
+    Order is preserved, so the better-ranked copy wins.
+    """
+    kept = []
+    kept_shingles = []
+    seen_keys = set()
+    for doc in documents:
+        key = doc.id or (doc.metadata.get("source"), doc.metadata.get("page"), doc.page_content)
+        if key in seen_keys:
+            continue
+        seen_keys.add(key)
+        shingles = _shingles(doc.page_content)
+        if any(len(shingles & other) / max(1, min(len(shingles), len(other))) >= threshold for other in kept_shingles):
+            continue
+        kept.append(doc)
+        kept_shingles.append(shingles)
+    return merge_adjacent_chunks(kept)
+
+class QueryExpansionCache:
+    """
+    LRU cache of MultiQuery expansions (the generated query variants) keyed by normalized question.
+    Persisted to a JSON file; pass path=None for an in-memory cache.
+    """
+
+    def __init__(self, path: str = EXPANSION_CACHE_FILE, max_entries: int = MAX_CACHED_EXPANSIONS):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        if path and os.path.exists(path):
+            with open(path, "r") as f:
+                try:
+                    self._entries = OrderedDict(json.load(f))
+                except json.JSONDecodeError:
+                    pass # Corrupt JSON
+
+    def get(self, question: str):
+        key = normalize_question(question)
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return list(self._entries[key])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def put(self, question: str, queries: list):
+        with self._lock:
+            self._entries[normalize_question(question)] = list(queries)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            if self.path:
+                with open(self.path, "w") as f:
+                    json.dump(self._entries, f)
+
+class CachedMultiQueryRetriever(MultiQueryRetriever):
+    """
+    MultiQueryRetriever whose query expansion can be cached or skipped per request.
+    Pick the mode with expansion_config(mode):
+      off    -> search with the original question only (no LLM call)
+      cached -> use cached variants if present, otherwise the original question (never calls the LLM)
+      always -> use cached variants if present, otherwise generate them with the LLM and cache them
+    With a lexical_index, BM25 hits are fused with the dense hits (reciprocal rank fusion), and a strong
+    lexical match on the original question is answered from the index alone (no expansion, no embedding call).
+    With a reranker, the merged results are cut down to the few best, non-redundant chunks before they reach the LLM.
+    """
+
+    expansion_cache: Any = None
+    default_mode: str = DEFAULT_EXPANSION_MODE
+    lexical_index: Any = None
+    lexical_fast_path: bool = True
+    reranker: Any = None
+
+    def expand_query(self, query: str, mode: str, run_manager) -> list:
+        with span("qa.expansion", mode=mode) as expansion:
+            if mode == "off":
+                return [query]
+            cached = self.expansion_cache.get(query) if self.expansion_cache is not None else None
+            expansion.set(cache_hit=bool(cached))
+            if cached:
+                return cached
+            if mode == "cached":
+                return [query]
+            queries = self.generate_queries(query, run_manager)
+            if self.expansion_cache is not None and queries:
+                self.expansion_cache.put(query, queries)
+            expansion.set(queries=len(queries))
+            return queries or [query]
+
+    def _get_relevant_documents(self, query: str, *, run_manager):
+        lexical = self._can_search_lexically()
+        if lexical and self.lexical_fast_path:
+            with span("qa.lexical_fast_path") as fast_path:
+                hits = self._lexical_hits(query)
+                strong = self.lexical_index.is_strong_match(query, hits)
+                fast_path.set(hit=strong)
+            if strong:
+                self.lexical_index.record_fast_path()
+                documents = self._fetch_chunks([chunk_id for chunk_id, _ in hits])
+                logger.info("Lexical fast path: %d chunks for '%s' (top BM25 %.2f)", len(documents), query, hits[0][1])
+                if self.reranker is not None:
+                    with span("qa.rerank", chunks_before=len(documents)):
+                        documents = self.reranker.rerank(query, documents)
+                return documents
+
+        mode = run_manager.metadata.get("expansion_mode", self.default_mode)
+        queries = self.expand_query(query, mode, run_manager)
+        if self.include_original and query not in queries:
+            queries.append(query)
+        query_vector = None
+        with span("qa.dense_search", queries=len(queries)):
+            vectors = None
+            if self._is_chroma_similarity():
+                # One embedding batch covers the variants and, for the reranker, the question itself
+                texts = queries + ([query] if self.reranker is not None and query not in queries else [])
+                vectors = self._embed_queries(texts)
+                if query in texts:
+                    query_vector = vectors[texts.index(query)]
+                vectors = vectors[:len(queries)]
+            result_lists = self.retrieve_result_lists(queries, run_manager, vectors)
+        if lexical:
+            with span("qa.lexical_search", queries=len(queries)):
+                lexical_lists = [self._fetch_chunks([chunk_id for chunk_id, _ in self._lexical_hits(q)]) for q in queries]
+            documents = reciprocal_rank_fusion(result_lists + lexical_lists)
+        else:
+            documents = interleave(result_lists)
+        unique = self.unique_union(documents)
+        logger.info("Retrieved %d chunks for %d queries, %d after de-duplication", len(documents), len(queries), len(unique))
+        if self.reranker is not None:
+            if query_vector is None:
+                query_vector = self.reranker.vectorstore.embeddings.embed_query(query)
+            with span("qa.rerank", chunks_before=len(unique)) as rerank:
+                unique = self.reranker.rerank(query, unique, query_vector)
+                rerank.set(chunks_after=len(unique))
+        return unique
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager):
+        # Same expansion / fusion / rerank path as invoke(), run off the event loop
+        return await run_in_executor(None, self._get_relevant_documents, query, run_manager=run_manager.get_sync())
+
+    def _is_chroma_similarity(self) -> bool:
+        return (
+            isinstance(self.retriever, VectorStoreRetriever)
+            and self.retriever.search_type == "similarity"
+            and isinstance(self.retriever.vectorstore, Chroma)
+        )
+
+    def _can_search_lexically(self) -> bool:
+        # Lexical hits are chunk IDs, so the chunk texts are read back from the Chroma collection
+        return (
+            self.lexical_index is not None
+            and self._is_chroma_similarity()
+            and self.lexical_index.supports_filter(self.retriever.search_kwargs.get("filter"))
+        )
+
+    def _lexical_hits(self, query: str) -> list:
+        search_kwargs = self.retriever.search_kwargs
+        return self.lexical_index.search(query, search_kwargs.get("k", 4), search_kwargs.get("filter"))
+
+    def _fetch_chunks(self, chunk_ids: list) -> list:
+        """Reads chunks by ID from the local collection, in the given order."""
+        if not chunk_ids:
+            return []
+        with span("vectordb.get", ids=len(chunk_ids)):
+            found = self.retriever.vectorstore.get(ids=chunk_ids, include=["documents", "metadatas"])
+        by_id = {
+            chunk_id: Document(id=chunk_id, page_content=text, metadata=metadata or {})
+            for chunk_id, text, metadata in zip(found["ids"], found["documents"], found["metadatas"])
+        }
+        return [by_id[chunk_id] for chunk_id in chunk_ids if chunk_id in by_id]
+
+    def retrieve_result_lists(self, queries: list, run_manager, vectors: list = None) -> list:
+        """
+        Runs the searches of all query variants together instead of one after another and returns one ranked list per query.
+        On a Chroma similarity retriever the variants are embedded in one batch (or vectors, if already embedded)
+        and searched in one query; any other retriever is called concurrently on a thread pool.
+        """
+        if self._is_chroma_similarity():
+            return self._batched_chroma_search(queries, vectors)
+        if len(queries) == 1:
+            return [self.retriever.invoke(queries[0], config={"callbacks": run_manager.get_child()})]
+        with ThreadPoolExecutor(max_workers=len(queries)) as pool:
+            return list(pool.map(
+                lambda query: self.retriever.invoke(query, config={"callbacks": run_manager.get_child()}),
+                queries,
+            ))
+
+    def _embed_queries(self, queries: list) -> list:
+        embedder = self.retriever.vectorstore.embeddings
+        if hasattr(embedder, "embed_queries"):
+            return embedder.embed_queries(queries)
+        return [embedder.embed_query(query) for query in queries]
+
+    def _batched_chroma_search(self, queries: list, vectors: list = None) -> list:
+        store = self.retriever.vectorstore
+        search_kwargs = dict(self.retriever.search_kwargs)
+        k = search_kwargs.pop("k", 4)
+        where = search_kwargs.pop("filter", None)
+        if vectors is None:
+            vectors = self._embed_queries(queries)
+        with span("vectordb.query", queries=len(vectors), k=k):
+            results = store._collection.query(
+                query_embeddings=vectors,
+                n_results=k,
+                where=where,
+                include=["documents", "metadatas"],
+            )
+        return [
+            [
+                Document(id=chunk_id, page_content=text, metadata=metadata or {})
+                for chunk_id, text, metadata in zip(ids, texts, metadatas)
+            ]
+            for ids, texts, metadatas in zip(results["ids"], results["documents"], results["metadatas"])
+        ]
+
+    def unique_union(self, documents: list) -> list:
+        return dedupe_documents(documents)
+
+def expansion_config(mode: str) -> dict:
+    """
+    Returns the invoke() config that selects the query expansion mode for one request,
+    e.g. qa_chain.invoke(question, config=expansion_config("off")).
+    """
+    if mode not in EXPANSION_MODES:
+        raise ValueError(f"Unknown expansion mode '{mode}'. Choose one of: {', '.join(EXPANSION_MODES)}")
+    return {"metadata": {"expansion_mode": mode}}
+
+def get_qa_chain(vectordb, k=12, chain_type="stuff", search_filter=None, answer_cache=None, use_llm_cache=False, expansion_cache=None, expansion_mode=DEFAULT_EXPANSION_MODE, context_packer=None, context_budget=CONTEXT_TOKEN_BUDGET, lexical_index=None, reranker=None): 
     """
     Creates a advanced QA chain using a tuned MultiQueryRetriever.
+    search_filter (e.g. {"source": "laws.pdf"}) limits retrieval to part of the corpus.
+    answer_cache (a SemanticAnswerCache) short-circuits near-identical questions.
+    use_llm_cache routes the query expansion and answer calls through the LLM response cache.
+    expansion_cache / expansion_mode control query expansion (see CachedMultiQueryRetriever); the mode can be overridden per request.
+    context_packer (or context_budget, in tokens) bounds the context sent to the stuff chain; pass context_budget=None to send everything.
+    lexical_index (a LexicalIndex) enables hybrid BM25 + vector retrieval and the lexical fast path.
+    reranker (an MMRReranker) keeps only the best few retrieved chunks.
     """
+    llm = get_llm(use_llm_cache)
+    search_kwargs = {'k': k}
+    if search_filter:
+        search_kwargs['filter'] = search_filter
+
     # Create MultiQueryRetriever
-    retriever_from_llm = MultiQueryRetriever.from_llm(
-        retriever=vectordb.as_retriever(search_kwargs={'k': k}),
+    retriever_from_llm = CachedMultiQueryRetriever.from_llm(
+        retriever=vectordb.as_retriever(search_kwargs=search_kwargs),
         llm=llm
     )
+    retriever_from_llm.expansion_cache = expansion_cache if expansion_cache is not None else QueryExpansionCache()
+    retriever_from_llm.default_mode = expansion_mode
+    retriever_from_llm.lexical_index = lexical_index
+    retriever_from_llm.reranker = reranker
+
+    retriever = retriever_from_llm
+    if context_packer is None and context_budget is not None:
+        context_packer = ContextPacker(context_budget)
+    if context_packer is not None:
+        retriever = PackedRetriever(base_retriever=retriever_from_llm, packer=context_packer)
 
     # Use the new, more powerful retriever in the QA chain
-    return RetrievalQA.from_chain_type(
+    chain = RetrievalQA.from_chain_type(
         llm=llm,
         chain_type=chain_type,
-        retriever=retriever_from_llm,
+        retriever=retriever,
         return_source_documents=True
     )
-
+    if answer_cache is not None:
+        return CachedQAChain(chain, answer_cache)
+    return chain
 
 
 # from langchain.chains import RetrievalQA
@@ -0,0 +1,31 @@
+# rate_limit.py
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: allows `rate` requests per second with bursts of up to `capacity`.
+    """
+
+    def __init__(self, rate: float, capacity: int = None):
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """Takes one token, sleeping until one is available; with blocking=False returns False instead of waiting."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if not blocking:
+                return False
+            time.sleep(wait)
@@ -0,0 +1,135 @@
+# reranker.py
+import logging
+import threading
+import time
+
+import numpy as np
+
+from lexical_index import tokenize
+
+RERANK_TOP_N = 6
+RERANK_RELATIVE_CUTOFF = 0.75  # drop chunks whose relevance is below this share of the best chunk's
+RERANK_MIN_KEEP = 3  # the most relevant chunks always survive the cutoff
+RERANK_DENSE_WEIGHT = 0.7  # relevance = weight * cosine + (1 - weight) * query term overlap
+RERANK_DIVERSITY = 0.3  # MMR trade-off: 0 = relevance only, 1 = diversity only
+
+logger = logging.getLogger("langchain.retrieval.multi_query")
+
+
+class MMRReranker:
+    """
+    Cheap local reranking stage: no cross-encoder and no extra API call for the chunks.
+    Relevance mixes the cosine similarity of the chunk's stored Chroma embedding to the question
+    with the share of question terms that appear in the chunk; Maximal Marginal Relevance then picks
+    up to top_n chunks that are relevant but not redundant, skipping any below the relative score cutoff
+    (but never keeping fewer than min_keep).
+    """
+
+    def __init__(
+        self,
+        vectorstore,
+        top_n: int = RERANK_TOP_N,
+        relative_cutoff: float = RERANK_RELATIVE_CUTOFF,
+        min_keep: int = RERANK_MIN_KEEP,
+        dense_weight: float = RERANK_DENSE_WEIGHT,
+        diversity: float = RERANK_DIVERSITY,
+    ):
+        self.vectorstore = vectorstore
+        self.top_n = top_n
+        self.relative_cutoff = relative_cutoff
+        self.min_keep = min_keep
+        self.dense_weight = dense_weight
+        self.diversity = diversity
+        self.records = []
+        self._lock = threading.Lock()
+
+    def _stored_embeddings(self, documents: list):
+        """Reads the chunk vectors back from the collection; returns None if any chunk has no stored vector."""
+        ids = [doc.id for doc in documents]
+        if not all(ids):
+            return None
+        found = self.vectorstore._collection.get(ids=ids, include=["embeddings"])
+        by_id = dict(zip(found["ids"], found["embeddings"]))
+        if len(by_id) < len(set(ids)):
+            return None
+        return np.asarray([by_id[chunk_id] for chunk_id in ids], dtype=np.float32)
+
+    @staticmethod
+    def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+    @staticmethod
+    def _term_overlap(query: str, documents: list) -> np.ndarray:
+        query_terms = set(tokenize(query))
+        if not query_terms:
+            return np.zeros(len(documents), dtype=np.float32)
+        return np.asarray(
+            [len(query_terms & set(tokenize(doc.page_content))) / len(query_terms) for doc in documents],
+            dtype=np.float32,
+        )
+
+    def rerank(self, query: str, documents: list, query_vector=None) -> list:
+        """
+        Returns the selected chunks, best first.
+        Without a query_vector (e.g. on the lexical fast path) relevance is the term overlap alone.
+        """
+        start = time.perf_counter()
+        if len(documents) <= 1:
+            return documents
+
+        relevance = self._term_overlap(query, documents)
+        vectors = self._stored_embeddings(documents)
+        if vectors is not None:
+            vectors = self._normalize_rows(vectors)
+            if query_vector is not None:
+                cosine = vectors @ self._normalize_rows(np.asarray(query_vector, dtype=np.float32))
+                relevance = self.dense_weight * cosine + (1 - self.dense_weight) * relevance
+            similarity = vectors @ vectors.T
+        else:
+            similarity = np.zeros((len(documents), len(documents)), dtype=np.float32)
+
+        # Cutoff relative to the best score; negative (cosine) scores count as 0, so they only pass via min_keep
+        best_score = max(float(relevance.max()), 0.0)
+        if best_score > 0:
+            eligible = np.clip(relevance, 0, None) >= self.relative_cutoff * best_score
+        else:
+            eligible = np.ones(len(documents), dtype=bool)
+        eligible[np.argsort(-relevance, kind="stable")[: self.min_keep]] = True
+        selected = []
+        redundancy = np.full(len(documents), -np.inf, dtype=np.float32)
+        while len(selected) < self.top_n and eligible.any():
+            if selected:
+                scores = (1 - self.diversity) * relevance - self.diversity * redundancy
+            else:
+                scores = relevance.copy()
+            scores[~eligible] = -np.inf
+            best = int(np.argmax(scores))
+            selected.append(best)
+            eligible[best] = False
+            redundancy = np.maximum(redundancy, similarity[:, best])
+
+        record = {
+            "query": query,
+            "chunks_before": len(documents),
+            "chunks_after": len(selected),
+            "seconds": time.perf_counter() - start,
+        }
+        with self._lock:
+            self.records.append(record)
+        logger.info(
+            "Reranked %d -> %d chunks in %.1f ms", record["chunks_before"], record["chunks_after"], record["seconds"] * 1000
+        )
+        return [documents[i] for i in selected]
+
+    def stats(self) -> dict:
+        with self._lock:
+            records = list(self.records)
+        if not records:
+            return {"queries": 0, "chunks_before": 0.0, "chunks_after": 0.0, "mean_ms": 0.0}
+        return {
+            "queries": len(records),
+            "chunks_before": sum(r["chunks_before"] for r in records) / len(records),
+            "chunks_after": sum(r["chunks_after"] for r in records) / len(records),
+            "mean_ms": 1000 * sum(r["seconds"] for r in records) / len(records),
+        }
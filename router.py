@@ -0,0 +1,105 @@
+# router.py
+import logging
+import re
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+
+from tracing import traced, current_span
+
+ROUTE_LEXICAL_COVERAGE = 0.6  # share of the question's IDF weight found in the best chunk
+ROUTE_DENSE_RELEVANCE = 0.7  # cosine similarity of the question to the best chunk
+AGENT_CALLS_PER_DOCUMENT_TURN = 2  # ReAct thought/action + final answer restating the tool output (1 if the tool returns directly)
+
+# Questions about the outside world go to the agent (and its web tools) even if their words appear in the document
+WEB_CUES = re.compile(
+    r"\b(latest|today|tonight|currently|news|recent(ly)?|this (week|month|year)|right now|weather|stock|price|"
+    r"who won|search the web|online|on the internet|google it)\b",
+    re.IGNORECASE,
+)
+
+logger = logging.getLogger("router")
+
+
+@dataclass
+class RouteDecision:
+    route: str  # "document" or "agent"
+    reason: str
+    lexical_score: float = 0.0
+    dense_score: float = 0.0
+
+
+class PreRouter:
+    """
+    Deterministic pre-dispatch in front of the ReAct agent.
+    A question whose terms are well covered by the document's BM25 index, or whose best chunk is close in embedding
+    space, goes straight to the QA chain; web-flavoured and ambiguous questions go to the agent.
+    Each routed document question saves the agent's own LLM calls; pass the document tool's return_direct,
+    since a tool that returns directly already skips the agent's final-answer call.
+    """
+
+    def __init__(self, vectordb, search_filter: dict = None, lexical_index=None, use_dense: bool = True,
+                 lexical_threshold: float = ROUTE_LEXICAL_COVERAGE, dense_threshold: float = ROUTE_DENSE_RELEVANCE,
+                 document_return_direct: bool = True):
+        self.vectordb = vectordb
+        self.search_filter = search_filter
+        self.lexical_index = lexical_index
+        self.use_dense = use_dense
+        self.lexical_threshold = lexical_threshold
+        self.dense_threshold = dense_threshold
+        self.agent_calls_avoided = AGENT_CALLS_PER_DOCUMENT_TURN - 1 if document_return_direct else AGENT_CALLS_PER_DOCUMENT_TURN
+        self.counts = {"document": 0, "agent": 0}
+        self._lock = threading.Lock()
+
+    def _lexical_score(self, question: str) -> float:
+        index = self.lexical_index
+        if index is None or not index.supports_filter(self.search_filter):
+            return 0.0
+        hits = index.search(question, 1, self.search_filter)
+        return index.coverage(question, hits[0][0]) if hits else 0.0
+
+    def _dense_score(self, question: str) -> float:
+        """Cosine similarity of the question to its nearest stored chunk (one query embedding, usually cached; no LLM call)."""
+        query_vector = np.asarray(self.vectordb.embeddings.embed_query(question), dtype=np.float32)
+        results = self.vectordb._collection.query(
+            query_embeddings=[query_vector.tolist()], n_results=1, where=self.search_filter, include=["embeddings"]
+        )
+        if not results["ids"] or not results["ids"][0]:
+            return 0.0
+        chunk_vector = np.asarray(results["embeddings"][0][0], dtype=np.float32)
+        norms = np.linalg.norm(query_vector) * np.linalg.norm(chunk_vector)
+        return float(query_vector @ chunk_vector / norms) if norms else 0.0
+
+    @traced("router.route")
+    def route(self, question: str) -> RouteDecision:
+        if WEB_CUES.search(question):
+            decision = RouteDecision("agent", "web cue")
+        else:
+            lexical = self._lexical_score(question)
+            if lexical >= self.lexical_threshold:
+                decision = RouteDecision("document", "lexical match", lexical)
+            else:
+                dense = self._dense_score(question) if self.use_dense else 0.0
+                if dense >= self.dense_threshold:
+                    decision = RouteDecision("document", "dense match", lexical, dense)
+                else:
+                    decision = RouteDecision("agent", "ambiguous", lexical, dense)
+
+        with self._lock:
+            self.counts[decision.route] += 1
+        current_span().set(route=decision.route, reason=decision.reason,
+                           lexical_score=decision.lexical_score, dense_score=decision.dense_score)
+        logger.info(
+            "Routed to %s (%s, lexical %.2f, dense %.2f)%s: %s",
+            decision.route, decision.reason, decision.lexical_score, decision.dense_score,
+            f", avoided {self.agent_calls_avoided} agent LLM calls" if decision.route == "document" else "",
+            question,
+        )
+        return decision
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self.counts)
+        counts["llm_calls_avoided"] = counts["document"] * self.agent_calls_avoided
+        return counts
@@ -0,0 +1,114 @@
+# streaming.py
+import sys
+import time
+
+FINAL_ANSWER_MARKER = "Final Answer:"
+ANSWER_CHAIN_NAME = "StuffDocumentsChain"  # the QA chain's answer-writing step
+
+
+class _FinalAnswerFilter:
+    """
+    The ReAct agent's LLM writes 'Thought: ... Action: ...' before the answer.
+    Tokens are buffered per LLM run and only the text after 'Final Answer:' is passed on.
+    """
+
+    def __init__(self):
+        self._buffers = {}
+        self._streaming = set()
+
+    def feed(self, run_id, text: str) -> str:
+        if run_id in self._streaming:
+            return text
+        buffer = self._buffers.get(run_id, "") + text
+        position = buffer.find(FINAL_ANSWER_MARKER)
+        if position == -1:
+            self._buffers[run_id] = buffer
+            return ""
+        self._buffers.pop(run_id, None)
+        self._streaming.add(run_id)
+        return buffer[position + len(FINAL_ANSWER_MARKER):].lstrip()
+
+
+def _chunk_text(chunk) -> str:
+    content = getattr(chunk, "content", chunk)
+    if isinstance(content, list):  # content blocks
+        return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+    return content or ""
+
+
+async def _stream_answer(runnable, inputs, direct_tools: set, out) -> tuple:
+    """
+    Runs `runnable` with astream_events and writes the answer to `out` token by token as it arrives.
+    The answer is the text after 'Final Answer:' from the agent's LLM or, inside a tool in direct_tools
+    (its output is the answer), the tokens of the QA chain's stuff-chain LLM.
+    Returns (root output, seconds to the first answer token or None, total seconds).
+    """
+    start = time.perf_counter()
+    first_token_at = None
+    answer_filter = _FinalAnswerFilter()
+    streamed_runs = set()
+    direct_tool_runs = set()
+    answer_chain_runs = set()
+    root_run_id = None
+    result = None
+
+    def emit(text: str):
+        nonlocal first_token_at
+        if not text:
+            return
+        if first_token_at is None:
+            first_token_at = time.perf_counter()
+            out.write("\n🤖 Agent Answer:\n ")
+        out.write(text)
+        out.flush()
+
+    def answer_text(event, text: str) -> str:
+        parents = set(event.get("parent_ids", []))
+        if parents & answer_chain_runs:
+            # Document answer: inside a direct tool every token is the answer, otherwise the agent restates it
+            return text if parents & direct_tool_runs else ""
+        return answer_filter.feed(event["run_id"], text)
+
+    async for event in runnable.astream_events(inputs, version="v2"):
+        kind = event["event"]
+        if root_run_id is None:
+            root_run_id = event["run_id"]
+        if kind == "on_tool_start" and event["name"] in direct_tools:
+            direct_tool_runs.add(event["run_id"])
+        elif kind == "on_chain_start" and event["name"] == ANSWER_CHAIN_NAME:
+            answer_chain_runs.add(event["run_id"])
+        elif kind == "on_chat_model_stream":
+            streamed_runs.add(event["run_id"])
+            emit(answer_text(event, _chunk_text(event["data"]["chunk"])))
+        elif kind == "on_chat_model_end" and event["run_id"] not in streamed_runs:
+            # Cache hit: the whole message comes at once
+            emit(answer_text(event, _chunk_text(event["data"].get("output"))))
+        elif kind in ("on_chain_end", "on_tool_end") and event["run_id"] == root_run_id:
+            result = event["data"].get("output")
+
+    if first_token_at is None:
+        # e.g. an answer-cache hit, a web result returned directly, or the agent stopped without a 'Final Answer:'
+        output = result.get("output") if isinstance(result, dict) else result
+        emit(str(output or "No answer found.").strip())
+    out.write("\n")
+    total = time.perf_counter() - start
+    return result, (first_token_at - start) if first_token_at is not None else None, total
+
+
+async def stream_agent_answer(agent, inputs: dict, out=sys.stdout) -> tuple:
+    """
+    Streams an agent turn. A document tool with return_direct streams its stuff-chain answer,
+    since that answer is the agent's output. Returns (agent output dict, ttft or None, total seconds).
+    LLM responses served from the response cache arrive as one piece instead of as a stream.
+    """
+    direct_tools = {tool.name for tool in agent.tools if tool.return_direct}
+    result, ttft, total = await _stream_answer(agent, inputs, direct_tools, out)
+    return result or {}, ttft, total
+
+
+async def stream_document_answer(document_tool, question: str, out=sys.stdout) -> tuple:
+    """
+    Streams a question routed straight to the document tool. Returns (answer text, ttft or None, total seconds).
+    """
+    result, ttft, total = await _stream_answer(document_tool, question, {document_tool.name}, out)
+    return str(result or "No answer found."), ttft, total
@@ -0,0 +1,62 @@
+# test_qa_chain.py
+import os
+import random
+
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("EMBEDDING_BACKEND", "hash")
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+
+from qa_chain import dedupe_documents
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 300
+
+
+def _page_text(seed: int, words: int = 600) -> str:
+    rng = random.Random(seed)
+    vocabulary = [f"term{i}" for i in range(400)]
+    sentences = []
+    while words > 0:
+        length = rng.randint(6, 14)
+        sentences.append(" ".join(rng.choice(vocabulary) for _ in range(length)).capitalize() + ".")
+        words -= length
+    return " ".join(sentences)
+
+
+def _split(text: str, page: int = 1) -> list:
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    chunks = splitter.split_documents([Document(page_content=text, metadata={"source": "doc.pdf", "page": page})])
+    for i, chunk in enumerate(chunks):
+        chunk.id = f"p{page}-c{i}"
+    return chunks
+
+
+def test_neighbouring_chunks_sharing_the_overlap_are_merged():
+    text = _page_text(seed=1)
+    first, second = _split(text)[:2]
+    assert second.page_content[:50] in first.page_content  # the splitter really overlapped them
+
+    result = dedupe_documents([second, first])
+
+    assert len(result) == 1
+    merged = result[0]
+    assert merged.id == second.id  # the better-ranked chunk keeps its place
+    assert merged.page_content in text
+    assert merged.page_content.startswith(first.page_content)
+    assert merged.page_content.endswith(second.page_content)
+
+
+def test_chunks_without_shared_text_are_kept_apart():
+    chunks = _split(_page_text(seed=2))
+    other_page = _split(_page_text(seed=3), page=2)
+    documents = [chunks[0], chunks[2], other_page[0]]
+
+    assert [doc.id for doc in dedupe_documents(documents)] == [doc.id for doc in documents]
+
+
+def test_repeated_chunks_are_dropped():
+    chunks = _split(_page_text(seed=4))
+
+    assert [doc.id for doc in dedupe_documents([chunks[0], chunks[0], chunks[2]])] == [chunks[0].id, chunks[2].id]
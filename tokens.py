@@ -0,0 +1,25 @@
+# tokens.py
+import threading
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def count_tokens(text: str) -> int:
+    """
+    Counts tokens with tiktoken's cl100k_base encoding.
+    Falls back to ~4 characters per token when the encoding can't be loaded (e.g. offline).
+    """
+    global _encoding
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding("cl100k_base")
+                except Exception as e:
+                    print(f"⚠️ tiktoken unavailable ({type(e).__name__}), estimating 4 characters per token.")
+                    _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text))
+    return max(1, len(text) // 4)
@@ -0,0 +1,349 @@
+# tracing.py
+import contextvars
+import functools
+import inspect
+import json
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tracers.context import register_configure_hook
+
+from tokens import count_tokens
+
+TRACE_FILE = "traces.jsonl"
+SERVICE_NAME = "document-qa-app"
+# OTLP enum values
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_CLIENT = 3
+STATUS_CODE_OK = 1
+STATUS_CODE_ERROR = 2
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+def _innermost_open_span():
+    """
+    The current span, skipping LangChain runs that already ended. LangChain may end a run in a different asyncio task
+    than the one that started it, so the context variable can still point at a finished run; its nearest open
+    ancestor is then the right parent. Manual spans always reset the variable themselves, so an ended one is only
+    seen by work it started in the background (e.g. the follow-up task), which stays in its trace.
+    """
+    span = _current_span.get()
+    while span is not None and span.end_ns is not None and span.from_callback:
+        span = span.parent
+    return span
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}  # int64 is a string in OTLP JSON
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(item) for item in value]}}
+    return {"stringValue": str(value)}
+
+
+class Span:
+    """One timed operation. Attributes are plain key/values; names may be dotted (e.g. 'gen_ai.usage.input_tokens')."""
+
+    def __init__(self, name: str, parent: "Span" = None, kind: int = SPAN_KIND_INTERNAL, attributes: dict = None):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent is not None else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+        self.from_callback = False
+
+    def set(self, **attributes) -> "Span":
+        self.attributes.update(attributes)
+        return self
+
+    def set_error(self, error: BaseException):
+        self.error = f"{type(error).__name__}: {error}"
+
+    @property
+    def seconds(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [
+                {"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items() if value is not None
+            ],
+            "status": {"code": STATUS_CODE_ERROR, "message": self.error} if self.error else {"code": STATUS_CODE_OK},
+        }
+        if self.parent is not None:
+            span["parentSpanId"] = self.parent.span_id
+        return span
+
+
+class _NoopSpan:
+    """Returned while tracing is off, so instrumented code never has to check."""
+
+    def set(self, **attributes) -> "_NoopSpan":
+        return self
+
+    def set_error(self, error: BaseException):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """
+    Collects spans and writes each finished trace as one OTLP/JSON line (an ExportTraceServiceRequest)
+    to a local file, which OpenTelemetry collectors and trace viewers can import.
+    A trace is written when its root span ends; spans that end later (e.g. a background follow-up)
+    are written as an extra line with the same traceId. Off until enable() is called.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.path = None
+        self.handler = None
+        self.exported = 0
+        self._lock = threading.Lock()
+        self._finished = {}
+        self._open_roots = set()
+        self._totals = {}
+
+    def enable(self, path: str = TRACE_FILE):
+        self.path = path
+        if self.handler is None:
+            self.handler = TracingCallbackHandler(self)
+            # Adds the handler to every LangChain run in every thread, like LangSmith's own tracer
+            register_configure_hook(contextvars.ContextVar("document_qa_tracing", default=self.handler), inheritable=True)
+        self.enabled = True
+
+    def start_span(self, name: str, parent: Span = None, kind: int = SPAN_KIND_INTERNAL, **attributes) -> Span:
+        span = Span(name, parent if parent is not None else _innermost_open_span(), kind, attributes)
+        if span.parent is None:
+            with self._lock:
+                self._open_roots.add(span.trace_id)
+        return span
+
+    def end_span(self, span: Span):
+        span.end_ns = time.time_ns()
+        batch = None
+        with self._lock:
+            count, seconds = self._totals.get(span.name, (0, 0.0))
+            self._totals[span.name] = (count + 1, seconds + span.seconds)
+            self._finished.setdefault(span.trace_id, []).append(span)
+            if span.parent is None:
+                self._open_roots.discard(span.trace_id)
+            if span.trace_id not in self._open_roots:
+                batch = self._finished.pop(span.trace_id)
+        if batch:
+            self._export(batch)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        if not self.enabled:
+            yield NOOP_SPAN
+            return
+        span = self.start_span(name, **attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set_error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            self.end_span(span)
+
+    def _export(self, spans: list):
+        line = json.dumps({
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+                "scopeSpans": [{"scope": {"name": "document-qa.tracing"}, "spans": [span.to_otlp() for span in spans]}],
+            }]
+        })
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+            self.exported += len(spans)
+
+    def stats(self, top: int = 8) -> list:
+        """(span name, count, total seconds) for the span names with the most total time."""
+        with self._lock:
+            totals = dict(self._totals)
+        return sorted(((name, count, seconds) for name, (count, seconds) in totals.items()), key=lambda row: -row[2])[:top]
+
+
+tracer = Tracer()
+
+
+def span(name: str, **attributes):
+    """Context manager timing a block as a child of the current span: `with span("qa.rerank", chunks=12) as s: ...`."""
+    return tracer.span(name, **attributes)
+
+
+def current_span():
+    """The innermost active span (manual or LangChain run), for adding attributes such as cache hits."""
+    span = _innermost_open_span() if tracer.enabled else None
+    return span if span is not None else NOOP_SPAN
+
+
+def traced(name: str):
+    """Decorator that wraps every call of a function or coroutine function in a span."""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def llm_usage(response, prompt_tokens: int = 0) -> dict:
+    """
+    Token counts and cache status of one LLM run's LLMResult. Uses the model's usage metadata when it reports it,
+    otherwise count_tokens on the completion and the given prompt estimate. Responses served by the
+    LLM response cache are flagged by SQLiteLLMCache in their generation_info.
+    """
+    generations = [generation for batch in response.generations for generation in batch]
+    usage = [getattr(getattr(g, "message", None), "usage_metadata", None) or {} for g in generations]
+    reported = bool(generations) and all("input_tokens" in u for u in usage)
+    return {
+        "input_tokens": sum(u["input_tokens"] for u in usage) if reported else prompt_tokens,
+        "output_tokens": sum(u["output_tokens"] for u in usage) if reported else sum(count_tokens(g.text) for g in generations),
+        "cache_hit": bool(generations) and all((g.generation_info or {}).get("cache_hit") for g in generations),
+    }
+
+
+def _run_name(serialized, kwargs: dict, default: str) -> str:
+    serialized = serialized or {}
+    return kwargs.get("name") or serialized.get("name") or (serialized.get("id") or [default])[-1]
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """
+    Turns LangChain runs (chains, the ReAct agent, tools, retrievers, LLM calls) into spans.
+    Each run's span becomes the current span when it starts, so manual spans inside it nest under it.
+    LLM spans carry the model, token counts, time to first token when streaming, and whether the cache answered.
+    """
+
+    run_inline = True  # keep callbacks in the caller's context, so the current span follows the run
+
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+        self._spans = {}
+        self._prompt_tokens = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id, parent_run_id, name: str, kind: int = SPAN_KIND_INTERNAL, **attributes):
+        if not self.tracer.enabled:
+            return
+        with self._lock:
+            parent = self._spans.get(parent_run_id)
+        span = self.tracer.start_span(name, parent=parent, kind=kind, **attributes)
+        span.from_callback = True
+        with self._lock:
+            self._spans[run_id] = span
+        _current_span.set(span)
+
+    def _end(self, run_id, error: BaseException = None, **attributes):
+        with self._lock:
+            span = self._spans.pop(run_id, None)
+        if span is None:
+            return
+        span.set(**attributes)
+        if error is not None:
+            span.set_error(error)
+        self.tracer.end_span(span)
+
+    # Chains and the agent
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs):
+        self._start(run_id, parent_run_id, f"chain.{_run_name(serialized, kwargs, 'chain')}")
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    def on_agent_action(self, action, *, run_id, **kwargs):
+        with self._lock:
+            span = self._spans.get(run_id)
+        if span is not None:
+            span.set(**{"agent.actions": span.attributes.get("agent.actions", 0) + 1, "agent.last_tool": action.tool})
+
+    # Tools and retrievers
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        self._start(run_id, parent_run_id, f"tool.{_run_name(serialized, kwargs, 'tool')}", **{"tool.input": input_str})
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    def on_retriever_start(self, serialized, query, *, run_id, parent_run_id=None, **kwargs):
+        self._start(run_id, parent_run_id, f"retriever.{_run_name(serialized, kwargs, 'retriever')}", query=query)
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._end(run_id, documents=len(documents))
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    # LLM calls
+    def _start_llm(self, serialized, prompt: str, run_id, parent_run_id, kwargs: dict):
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model") or params.get("model_name") or params.get("_type") or _run_name(serialized, kwargs, "llm")
+        with self._lock:
+            self._prompt_tokens[run_id] = count_tokens(prompt)
+        self._start(run_id, parent_run_id, f"llm.{model}", SPAN_KIND_CLIENT, **{"gen_ai.request.model": model})
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        self._start_llm(serialized, "\n".join(prompts), run_id, parent_run_id, kwargs)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        prompt = "\n".join(str(message.content) for batch in messages for message in batch)
+        self._start_llm(serialized, prompt, run_id, parent_run_id, kwargs)
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        with self._lock:
+            span = self._spans.get(run_id)
+        if span is not None and "gen_ai.time_to_first_token_ms" not in span.attributes:
+            span.set(**{"gen_ai.time_to_first_token_ms": (time.time_ns() - span.start_ns) / 1e6})
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self._lock:
+            prompt_tokens = self._prompt_tokens.pop(run_id, 0)
+        usage = llm_usage(response, prompt_tokens)
+        self._end(run_id, **{
+            "gen_ai.usage.input_tokens": usage["input_tokens"],
+            "gen_ai.usage.output_tokens": usage["output_tokens"],
+            "cache_hit": usage["cache_hit"],
+        })
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self._prompt_tokens.pop(run_id, None)
+        self._end(run_id, error)
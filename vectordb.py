@@ -1,34 +1,138 @@
 # vectordb.py  (LangChain v0.3.27)
 
+import hashlib
 from langchain_chroma import Chroma
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from config import API_KEY
+from embedding_cache import CachedEmbeddings
+from fake_backends import HashingEmbeddings
+from ingestion import embed_and_upsert, embed_and_upsert_stream, iter_batches, IngestionCheckpoint, EMBED_BATCH_SIZE
+from tracing import traced, current_span
 
 VECTOR_DB_DIR = "./chroma_db"  
 COLLECTION_NAME = "document_chunks"  # ye hum 
 
-def create_vectordb_from_docs(docs, embedding_model: str) -> Chroma: 
+def get_embedding_function(embedding_model: str) -> CachedEmbeddings:
+    """
+    Returns the Google embedder wrapped in the persistent embedding cache,
+    so repeated chunk texts and queries never hit the API twice.
+    A "hashing-*" model name (see fake_backends.resolve_embedding_model) selects the offline hashing embedder.
+    """
+    if embedding_model.startswith("hashing-"):
+        return CachedEmbeddings(HashingEmbeddings(dim=int(embedding_model.split("-")[1])), model_name=embedding_model)
+    return CachedEmbeddings(
+        GoogleGenerativeAIEmbeddings(google_api_key=API_KEY, model=embedding_model),
+        model_name=embedding_model,
+    )
+
+@traced("vectordb.create")
+def create_vectordb_from_docs(docs, embedding_model: str, persist_directory: str = VECTOR_DB_DIR,
+                              embedding_function=None) -> Chroma: 
     """
     Creates a new Chroma vector database from documents and persists it.
+    persist_directory and embedding_function can be overridden, e.g. by the benchmarks to index into a scratch directory.
     """
     print(f"🧠 Creating embeddings with model: {embedding_model}")
-    embedding_function = GoogleGenerativeAIEmbeddings(google_api_key=API_KEY, model=embedding_model)
+    embedding_function = embedding_function or get_embedding_function(embedding_model)
     
-    vectordb = Chroma.from_documents(
-        documents=docs,
-        embedding=embedding_function,
-        persist_directory=VECTOR_DB_DIR, # ye hum log ko ye batata hai ki database kaha save karna hai
+    vectordb = Chroma(
+        embedding_function=embedding_function,
+        persist_directory=persist_directory, # ye hum log ko ye batata hai ki database kaha save karna hai
         collection_name=COLLECTION_NAME, # ye hum log ko ye batata hai ki collection ka naam kya hoga
     )
+    embed_and_upsert(vectordb, docs)
     print("✅ Vector database created and saved.")
     return vectordb
 
+def iter_chunk_ids(docs, source_key: str, chunk_config: dict, embedding_model: str):
+    """
+    Yields (chunk_id, doc) pairs with content-addressed chunk IDs: a hash of the chunk text, the chunk config, the embedding model and the file.
+    An unchanged chunk keeps its ID (and its vector) when other pages of the file are edited.
+    Repeated texts inside one file get an occurrence counter so IDs stay unique.
+    """
+    config_string = f"{chunk_config['size']}-{chunk_config['overlap']}-{embedding_model}-{source_key}"
+    seen = {}
+    for doc in docs:
+        text_hash = hashlib.sha256(f"{config_string}\n{doc.page_content}".encode("utf-8")).hexdigest()
+        occurrence = seen.get(text_hash, 0)
+        seen[text_hash] = occurrence + 1
+        yield (text_hash[:32] if occurrence == 0 else f"{text_hash[:32]}-{occurrence}"), doc
+
+@traced("vectordb.delete")
+def delete_file_chunks(vectordb: Chroma, source_key: str, chunk_ids: list = None):
+    """
+    Deletes one file's chunks from the collection.
+    Falls back to a 'source' metadata filter when the chunk IDs are unknown (old cache format).
+    """
+    if chunk_ids:
+        vectordb.delete(ids=chunk_ids)
+    else:
+        vectordb._collection.delete(where={"source": source_key})
+
+@traced("vectordb.sync")
+def sync_file_chunks(vectordb: Chroma, source_key: str, docs, chunk_config: dict, embedding_model: str, old_chunk_ids: list = None):
+    """
+    Streams one file's chunks (any iterable, e.g. pdf_loader.iter_split_pdf) into the collection,
+    embedding only the chunks that are not already stored.
+    Unchanged chunks keep their vectors (only their metadata, e.g. a shifted page number, is updated).
+    Chunks that disappeared from the file are deleted at the end; every other file is left untouched.
+    Returns the new chunk IDs and a stats dict with how many embeddings were reused and computed.
+    """
+    if old_chunk_ids is None:
+        delete_file_chunks(vectordb, source_key)
+        old_chunk_ids = []
+
+    # Chunks upserted by an interrupted build are already in the collection too
+    checkpoint = IngestionCheckpoint()
+    known_ids = set(old_chunk_ids) | checkpoint.completed_ids(source_key)
+
+    new_ids = []
+    stats = {"reused": 0, "computed": 0, "deleted": 0}
+
+    def with_source(chunks):
+        for doc in chunks:
+            doc.metadata["source"] = source_key
+            yield doc
+
+    def missing_pairs():
+        pairs = iter_chunk_ids(with_source(docs), source_key, chunk_config, embedding_model)
+        for batch in iter_batches(pairs, EMBED_BATCH_SIZE):
+            new_ids.extend(chunk_id for chunk_id, _ in batch)
+            candidate_ids = [chunk_id for chunk_id, _ in batch if chunk_id in known_ids]
+            existing_ids = set(vectordb.get(ids=candidate_ids, include=[])["ids"]) if candidate_ids else set()
+
+            reused = [(chunk_id, doc) for chunk_id, doc in batch if chunk_id in existing_ids]
+            if reused:
+                vectordb._collection.update(
+                    ids=[chunk_id for chunk_id, _ in reused],
+                    metadatas=[doc.metadata for _, doc in reused],
+                )
+                stats["reused"] += len(reused)
+
+            for chunk_id, doc in batch:
+                if chunk_id not in existing_ids:
+                    stats["computed"] += 1
+                    yield chunk_id, doc
+
+    print(f"🧠 Streaming chunks of '{source_key}' into the vector database")
+    embed_and_upsert_stream(vectordb, missing_pairs(), source_key=source_key, checkpoint=checkpoint)
+
+    stale_ids = list(known_ids - set(new_ids))
+    if stale_ids:
+        delete_file_chunks(vectordb, source_key, stale_ids)
+    stats["deleted"] = len(stale_ids)
+
+    print(f"♻️ Embeddings reused: {stats['reused']}, computed: {stats['computed']}, deleted: {stats['deleted']}")
+    current_span().set(**stats)
+    return new_ids, stats
+
+@traced("vectordb.load")
 def load_existing_vectordb(embedding_model: str) -> Chroma:
     """
     Loads an existing Chroma vector database from disk.
     """
     print("✅ Loading existing vector database from disk.")
-    embedding_function = GoogleGenerativeAIEmbeddings(google_api_key=API_KEY, model=embedding_model)
+    embedding_function = get_embedding_function(embedding_model)
     
     vectordb = Chroma(
         collection_name=COLLECTION_NAME,
@@ -0,0 +1,204 @@
+# web_search.py
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+
+from tracing import current_span
+
+WEB_SEARCH_CACHE_FILE = "web_search_cache.json"
+WEB_SEARCH_TTL_SECONDS = 6 * 3600
+MAX_CACHED_SEARCHES = 1000
+ENGINE_TIMEOUT_SECONDS = 8.0
+SEARCH_MODES = ("sequential", "first", "merge")
+DEFAULT_SEARCH_MODE = "sequential"  # first/merge query every engine (paid ones too) on each search
+# Engines report "nothing found" as a normal string
+EMPTY_RESULT_MARKERS = ("no good", "no results", "no result found")
+
+
+def normalize_query(query: str) -> str:
+    return re.sub(r"\s+", " ", query).strip().rstrip("?!. ").lower()
+
+
+class SearchEngine:
+    """
+    One web search backend: a name, a function query -> text, and its own timeout.
+    """
+
+    def __init__(self, name: str, run, timeout: float = ENGINE_TIMEOUT_SECONDS):
+        self.name = name
+        self.run = run
+        self.timeout = timeout
+
+
+class LocalSearchBackend:
+    """
+    Offline stand-in for a web search engine, for benchmarks and tests.
+    Returns deterministic snippets derived from the query after a simulated latency (seeded by the query, so reproducible).
+    """
+
+    def __init__(self, latency: float = 0.3, jitter: float = 0.1, results: int = 3):
+        self.latency = latency
+        self.jitter = jitter
+        self.results = results
+
+    def __call__(self, query: str) -> str:
+        seed = int(hashlib.sha256(query.encode("utf-8")).hexdigest()[:8], 16)
+        rng = random.Random(seed)
+        time.sleep(max(0.0, self.latency + rng.uniform(-self.jitter, self.jitter)))
+        return " ".join(
+            f"[{i + 1}] Result about '{query}' (doc {rng.randrange(10_000)})." for i in range(self.results)
+        )
+
+
+class WebSearchCache:
+    """
+    Disk cache of search results keyed by normalized query and engine set, with a TTL.
+    """
+
+    def __init__(self, path: str = WEB_SEARCH_CACHE_FILE, ttl_seconds: float = WEB_SEARCH_TTL_SECONDS,
+                 max_entries: int = MAX_CACHED_SEARCHES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = {}
+        if path and os.path.exists(path):
+            with open(path, "r") as f:
+                try:
+                    self._entries = json.load(f)
+                except json.JSONDecodeError:
+                    self._entries = {} # Corrupt JSON
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry["created"] > self.ttl_seconds:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry["result"]
+
+    def put(self, key: str, result: str):
+        with self._lock:
+            now = time.time()
+            self._entries = {k: e for k, e in self._entries.items() if now - e["created"] <= self.ttl_seconds}
+            self._entries[key] = {"result": result, "created": now}
+            if len(self._entries) > self.max_entries:
+                oldest = sorted(self._entries, key=lambda k: self._entries[k]["created"])
+                for k in oldest[:len(self._entries) - self.max_entries]:
+                    del self._entries[k]
+            if self.path:
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(self._entries, f)
+                os.replace(tmp_path, self.path)
+
+
+def _is_good(result) -> bool:
+    text = str(result or "").strip()
+    return bool(text) and not any(marker in text.lower()[:80] for marker in EMPTY_RESULT_MARKERS)
+
+
+class WebSearch:
+    """
+    Shared search layer behind the agent's web tool.
+      sequential -> engines in order, each with its own timeout, until one gives a good result
+      first      -> all engines at once, the first good result wins
+      merge      -> all engines at once, every good result within the timeouts is combined
+    Results are cached on disk by normalized query. Each engine call runs on its own daemon thread:
+    a call that times out can't be interrupted, but it only ties up its own thread, never later searches.
+    """
+
+    def __init__(self, engines: list, mode: str = DEFAULT_SEARCH_MODE, cache: WebSearchCache = None):
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{mode}'. Choose one of: {', '.join(SEARCH_MODES)}")
+        self.engines = engines
+        self.mode = mode
+        self.cache = cache
+        self.wins = {engine.name: 0 for engine in engines}
+        self.timeouts = {engine.name: 0 for engine in engines}
+
+    def _key(self, query: str) -> str:
+        return f"{self.mode}|{','.join(engine.name for engine in self.engines)}|{normalize_query(query)}"
+
+    def _call(self, engine: SearchEngine, query: str):
+        try:
+            return engine.run(query)
+        except Exception as e:
+            print(f"⚠️ {engine.name} search failed: {e}")
+            return None
+
+    def _submit(self, engine: SearchEngine, query: str) -> Future:
+        future = Future()
+
+        def run():
+            if future.set_running_or_notify_cancel():
+                future.set_result(self._call(engine, query))
+
+        threading.Thread(target=run, name=f"web-search-{engine.name}", daemon=True).start()
+        return future
+
+    def _sequential(self, query: str):
+        for engine in self.engines:
+            future = self._submit(engine, query)
+            done, _ = wait([future], timeout=engine.timeout)
+            if not done:
+                self.timeouts[engine.name] += 1
+                future.cancel()  # a call already running finishes on its own thread and is ignored
+                continue
+            if _is_good(future.result()):
+                self.wins[engine.name] += 1
+                return future.result()
+        return None
+
+    def _fan_out(self, query: str):
+        start = time.monotonic()
+        futures = {self._submit(engine, query): engine for engine in self.engines}
+        pending = set(futures)
+        results = []
+        while pending:
+            # Wait until the next engine finishes or the earliest remaining engine deadline passes
+            remaining = min(futures[f].timeout for f in pending) - (time.monotonic() - start)
+            done, pending = wait(pending, timeout=max(0.0, remaining), return_when=FIRST_COMPLETED)
+            for future in done:
+                engine = futures[future]
+                if _is_good(future.result()):
+                    self.wins[engine.name] += 1
+                    if self.mode == "first":
+                        return future.result()
+                    results.append(f"[{engine.name}] {future.result()}")
+            elapsed = time.monotonic() - start
+            for future in [f for f in pending if futures[f].timeout <= elapsed]:
+                self.timeouts[futures[future].name] += 1
+                future.cancel()  # a call already running finishes on its own thread and is ignored
+                pending.discard(future)
+        return "\n".join(results) or None
+
+    def run(self, query: str) -> str:
+        current_span().set(**{"web_search.mode": self.mode})
+        if self.cache is not None:
+            cached = self.cache.get(self._key(query))
+            current_span().set(cache_hit=cached is not None)
+            if cached is not None:
+                return cached
+        result = self._sequential(query) if self.mode == "sequential" else self._fan_out(query)
+        if result is None:
+            return "No good search result was found."
+        if self.cache is not None:
+            self.cache.put(self._key(query), result)
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "cache_hits": self.cache.hits if self.cache is not None else 0,
+            "cache_misses": self.cache.misses if self.cache is not None else 0,
+            "wins": dict(self.wins),
+            "timeouts": dict(self.timeouts),
+        }